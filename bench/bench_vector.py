@@ -0,0 +1,86 @@
+# Vector micro-benchmark
+# Compares memory and allocations of the slotted Vector against the same
+# class with an instance dict, and operators against in place operators.
+#   python bench/bench_vector.py
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import tracemalloc
+from timeit import timeit
+from lib.vector import Vector
+
+# Subclass without __slots__ gets a dict like Vector used to have
+class DictVector(Vector):
+    pass
+
+COUNT = 100_000
+STEPS = 100_000
+
+
+def measure(func) -> tuple:
+    "Returns (allocated blocks, peak bytes) while running func"
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return blocks, peak
+
+
+def count_vectors(func) -> int:
+    "Returns number of Vectors created while running func"
+    init = Vector.__init__
+    created = [0]
+    def counting_init(self, x, y):
+        created[0] += 1
+        init(self, x, y)
+
+    Vector.__init__ = counting_init
+    try:
+        func()
+    finally:
+        Vector.__init__ = init
+    return created[0]
+
+
+def create(cls):
+    return lambda: [cls(i, i) for i in range(COUNT)]
+
+
+def integrate_new():
+    pos = Vector(0, 0)
+    vel = Vector(1, 1)
+    for _ in range(STEPS):
+        pos = pos + vel * 0.5
+    return pos
+
+
+def integrate_inplace():
+    pos = Vector(0, 0)
+    vel = Vector(1, 1)
+    step = Vector(0, 0)
+    for _ in range(STEPS):
+        step.set_as(vel.x, vel.y)
+        step *= 0.5
+        pos += step
+    return pos
+
+
+def timed(func, number: int = 5) -> float:
+    return timeit(func, number=number) / number * 1000
+
+
+if __name__ == "__main__":
+    print(f"{COUNT} instances")
+    for name, cls in (("dict Vector", DictVector), ("slotted Vector", Vector)):
+        blocks, peak = measure(create(cls))
+        print(f"{name:<26} {blocks:>8} blocks {peak / 1024:>9.1f} KiB {timed(create(cls)):>8.2f} ms")
+
+    print(f"\n{STEPS} integration steps")
+    for name, func in (("pos = pos + vel * 0.5", integrate_new), ("pos += step (in place)", integrate_inplace)):
+        print(f"{name:<26} {count_vectors(func):>8} vectors allocated {timed(func):>8.2f} ms")
@@ -0,0 +1,101 @@
+# Verlet benchmark
+# Compares update_points and update_lines on dict lists against the
+# vectorized Verlet class for a cloth grid pinned along the top row.
+# Both are compared at equal stiffness: Verlet uses the fewest iterations
+# that keep the constraint error at or below the dict version's.
+#   python bench/bench_verlet.py
+
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from math import sqrt
+from timeit import timeit
+from lib.entities import Verlet, update_points, update_lines
+import numpy as np
+
+ITERATIONS = 3
+GRAVITY    = 0.2
+SPACING    = 4
+STEPS      = 120 # steps the constraint error is averaged over
+
+
+def dict_cloth(cols: int, rows: int, iterations: int = ITERATIONS) -> tuple:
+    "Returns `(step, error)` functions"
+    points = []
+    for r in range(rows):
+        for c in range(cols):
+            x = c * SPACING
+            y = r * SPACING
+            points.append({"x": x, "y": y, "ox": x, "oy": y, "pinned": r == 0})
+
+    lines = []
+    for r in range(rows):
+        for c in range(cols):
+            p = points[c + r * cols]
+            if c + 1 < cols: lines.append({"p1": p, "p2": points[c + 1 + r * cols], "dist": SPACING})
+            if r + 1 < rows: lines.append({"p1": p, "p2": points[c + (r + 1) * cols], "dist": SPACING})
+
+    def step():
+        update_points(points, 0, GRAVITY)
+        for _ in range(iterations):
+            update_lines(lines)
+
+    # Mean stretch of the lines relative to their rest length
+    def error():
+        total = 0
+        for l in lines:
+            dx = l["p1"]["x"] - l["p2"]["x"]
+            dy = l["p1"]["y"] - l["p2"]["y"]
+            total += abs(sqrt(dx*dx + dy*dy) - l["dist"]) / l["dist"]
+        return total / len(lines)
+
+    return step, error
+
+
+def verlet_cloth(cols: int, rows: int, iterations: int = ITERATIONS) -> tuple:
+    "Returns `(step, error)` functions"
+    sim = Verlet(iterations)
+    for r in range(rows):
+        for c in range(cols):
+            sim.add_point(c * SPACING, r * SPACING, r == 0)
+
+    for r in range(rows):
+        for c in range(cols):
+            p = c + r * cols
+            if c + 1 < cols: sim.add_line(p, p + 1)
+            if r + 1 < rows: sim.add_line(p, p + cols)
+
+    def error():
+        lines = sim.lines[:sim.num_lines]
+        delta = sim.pos[lines[:, 0]] - sim.pos[lines[:, 1]]
+        dists = sim.dists[:sim.num_lines]
+        return (np.abs(np.sqrt((delta * delta).sum(axis=1)) - dists) / dists).mean()
+
+    return lambda: sim.step(0, GRAVITY), error
+
+
+# Drops the cloth from rest and returns its constraint error averaged over
+# every step, so the value does not depend on where the swing ends
+def stretch(cloth: tuple) -> float:
+    step, error = cloth
+    total = 0
+    for _ in range(STEPS):
+        step()
+        total += error()
+    return total / STEPS
+
+
+if __name__ == "__main__":
+    print(f"{'points':>8} {'dict lists':>12} {'Verlet':>12} {'iters':>6} {'error':>14} {'speedup':>8}")
+    for size in (10, 32, 64, 100):
+        number = 20
+        old_error = stretch(dict_cloth(size, size))
+
+        # Fewest Verlet iterations that are at least as stiff
+        iterations = 1
+        while (new_error := stretch(verlet_cloth(size, size, iterations))) > old_error and iterations < ITERATIONS * 10:
+            iterations += 1
+
+        old = timeit(dict_cloth(size, size)[0], number=number) / number * 1000
+        new = timeit(verlet_cloth(size, size, iterations)[0], number=number) / number * 1000
+        print(f"{size * size:>8} {old:>10.2f}ms {new:>10.2f}ms {iterations:>6} {old_error:>6.4f}/{new_error:<7.4f} {old / new:>7.1f}x")
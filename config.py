@@ -6,6 +6,8 @@ ASPECT_RATIO = 16 / 9
 FULLSCREEN   = False
 WINDOW_SCALE = 4
 FPS          = 60
+UPDATE_RATE  = 60 # fixed updates per second
+MAX_UPDATES  = 5  # max catch up updates per frame
 
 TILESIZE = 16
 HEIGHT   = 9  * TILESIZE
@@ -33,15 +35,48 @@ def append_setup(func) -> None:
 
 def setup():
     _loops.sort(key=lambda f: f[0])
+    _updates.sort(key=lambda f: f[0])
     for f in _setups: f()
 
+# Called once per frame as func(win, dt)
 _loops = []
 def append_loop(func, layer: int = 0) -> None:
     _loops.append([layer, func, False])
 
+# Called UPDATE_RATE times per second as func(dt) with fixed dt in ms,
+# no matter the frame rate. Use for physics and game logic
+_updates = []
+def append_update(func, layer: int = 0) -> None:
+    _updates.append([layer, func, False])
+
+# Called once per frame as func(win, alpha) in the same layers as loops.
+# Alpha (0-1) is how far the frame is between the last two updates,
+# used to interpolate positions when drawing
+alpha = 0
+def append_draw(func, layer: int = 0) -> None:
+    _loops.append([layer, lambda win, dt: func(win, alpha), False])
+
+# Fixed timestep: frame time is added to the accumulator and spent in
+# whole update steps. Slow frames run at most MAX_UPDATES steps and drop
+# the rest, so the game slows down instead of falling further behind
+_accumulator = 0
 def loop(win: object, dt: int):
-    global cols
+    global cols, alpha, _accumulator
     cols = pad*2 # account for fps
+
+    step = 1000 / UPDATE_RATE
+    _accumulator += dt
+    updates = 0
+    while _accumulator >= step and updates < MAX_UPDATES:
+        for f in _updates:
+            if not f[2]: f[1](step)
+        _accumulator -= step
+        updates += 1
+
+    if _accumulator >= step:
+        _accumulator %= step
+
+    alpha = _accumulator / step
     for f in _loops:
         if not f[2]: f[1](win, dt)
     
@@ -51,11 +86,11 @@ def loop(win: object, dt: int):
     log_queue.clear()
 
 def lock_layer(layer: int) -> None:
-    for f in _loops:
+    for f in _loops + _updates:
         if f[0] == layer: f[2] = True
 
 def unlock_layer(layer: int) -> None:
-    for f in _loops:
+    for f in _loops + _updates:
         if f[0] == layer: f[2] = False
 
 
@@ -1,6 +1,11 @@
-# Version 1.0
+# Version 1.4
 # Collision functions
 
+import numpy as np
+
+# Side names for array based collision results. Side codes index this tuple
+SIDES = ("", "top", "right", "left", "bottom")
+
 def collision_rect_rect(a: tuple, b: tuple) -> bool:
     """
         Checks to see if a collision is happening between two objects.
@@ -65,4 +70,136 @@ def find_collision_rect_rect(a: tuple, b: tuple) -> str:
 
     # Side note:
     # This method can be used without the need of a collison. It will just return the side the other
-    # collider is on in relation to this one.
\ No newline at end of file
+    # collider is on in relation to this one.
+
+
+# Array version of collision_rect_rect. Every rect in a is tested against
+# every rect in b in one step, so the (N, M) table must fit in memory
+def collision_rects_rects(a, b = None) -> tuple:
+    """
+        Finds all overlapping pairs between two sets of rects.\n
+        Params:\n
+        \ta, b: (N, 4) and (M, 4) arrays with x, y, w, h values. Leave b
+        \tout to check a against itself
+        Returns:\n
+        \ttuple: Index arrays (i, j) where a[i] overlaps b[j]. When checking
+        \ta against itself each pair is returned once with i < j
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = a if b is None else np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ax, ay, aw, ah = (a[:, k, None] for k in range(4))
+    bx, by, bw, bh = (b[None, :, k] for k in range(4))
+
+    # Same separation test as collision_rect_rect
+    outside = (ay > by + bh) | (ax > bx + bw) | (ax + aw < bx) | (ay + ah < by)
+    i, j = np.nonzero(~outside)
+
+    if b is a:
+        keep = i < j
+        i, j = i[keep], j[keep]
+
+    return i, j
+
+
+# Array version of find_collision_rect_rect for pairs found by
+# collision_rects_rects. Works on rects instead of objects
+def find_collision_rects_rects(a, b, i, j) -> np.ndarray:
+    """
+        Finds the side of each collision relative to a.\n
+        Params:\n
+        \ta, b: Rect arrays given to collision_rects_rects. b can be None
+        \ti, j: Index arrays returned by collision_rects_rects
+        Returns:\n
+        \tarray: Side codes, index into SIDES
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = a if b is None else np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ra = a[i]
+    rb = b[j]
+
+    dx = ra[:, 0] + ra[:, 2] / 2 - (rb[:, 0] + rb[:, 2] / 2)
+    dy = ra[:, 1] + ra[:, 3] / 2 - (rb[:, 1] + rb[:, 3] / 2)
+
+    x_axis = dx * dx > dy * dy
+    return np.where(
+        x_axis,
+        np.where(dx > 0, SIDES.index("right"), SIDES.index("left")),
+        np.where(dy > 0, SIDES.index("bottom"), SIDES.index("top")),
+    )
+
+
+# Sweep and prune broadphase for objects with a rect() method, like Entity.
+# Objects are kept sorted by their left edge. Since objects move little
+# between frames the list stays nearly sorted, so insertion sort is close
+# to linear and only neighbours along the x axis are ever compared.
+# Pairs where both objects have sleeping set to True are skipped.
+class Broadphase:
+    def __init__(self) -> None:
+        """
+        Finds colliding pairs without checking every object against every other.
+
+        Methods:\n
+        \t.add() - add object with a rect() method
+        \t.remove() - remove object
+        \t.update() - reads new rects, call once per frame after moving
+        \t.pairs() - returns list of overlapping (a, b) pairs
+        \t.collisions() - returns list of (a, b, side) for overlapping pairs"""
+        self.entries = [] # [rect, obj, sleeping]
+
+
+    def add(self, obj: object) -> None:
+        self.entries.append([obj.rect(), obj, getattr(obj, "sleeping", False)])
+        self._sort()
+
+
+    def remove(self, obj: object) -> None:
+        for entry in self.entries:
+            if entry[1] is obj:
+                self.entries.remove(entry)
+                return
+
+
+    def update(self) -> None:
+        for entry in self.entries:
+            entry[0] = entry[1].rect()
+            entry[2] = getattr(entry[1], "sleeping", False)
+        self._sort()
+
+
+    # Insertion sort on the left edge of each rect
+    def _sort(self) -> None:
+        entries = self.entries
+        for i in range(1, len(entries)):
+            entry = entries[i]
+            x = entry[0][0]
+            j = i - 1
+            while j >= 0 and entries[j][0][0] > x:
+                entries[j + 1] = entries[j]
+                j -= 1
+            entries[j + 1] = entry
+
+
+    def pairs(self) -> list:
+        "Returns list of (a, b) tuples of objects that overlap"
+        found = []
+        entries = self.entries
+        for i, (a, obj_a, sleep_a) in enumerate(entries):
+            right = a[0] + a[2]
+            for j in range(i + 1, len(entries)):
+                b, obj_b, sleep_b = entries[j]
+                # Sorted by left edge, so no later object can overlap on x
+                if b[0] > right:
+                    break
+
+                if sleep_a and sleep_b:
+                    continue
+
+                if collision_rect_rect(a, b):
+                    found.append((obj_a, obj_b))
+
+        return found
+
+
+    def collisions(self) -> list:
+        "Returns list of (a, b, side) tuples. Side is relative to a"
+        return [(a, b, find_collision_rect_rect(a, b)) for a, b in self.pairs()]
@@ -1,7 +1,9 @@
-# Version 1.0
+# Version 1.3
 
 from math import sqrt
 from lib.vector import Vector
+from lib.collision import collision_rects_rects, find_collision_rects_rects
+import numpy as np
 
 class Entity:
     def __init__(self, size):
@@ -17,9 +19,10 @@ class Entity:
         self.lines  = [] # { p1, p2, dist }
         self.rects  = [] # { p1, p2, p3, p4 }
 
-        self.density = 0
-        self.layer   = 1
-        self.mass    = 0
+        self.density  = 0
+        self.layer    = 1
+        self.mass     = 0
+        self.sleeping = False # Broadphase skips pairs where both are sleeping
 
         self.sprite = None
         self.size   = Vector(size[0], size[1])
@@ -33,7 +36,7 @@ class Entity:
 # Updates all points to their new poisition given their old one and external forces
 def update_points(points: list[dict], xsum_force: int = 0, ysum_force: int = 0) -> None:
     for p in points:
-        if p.pinned: continue
+        if p["pinned"]: continue
         velx = p["x"] - p["ox"]
         vely = p["y"] - p["oy"]
         p["ox"] = p["x"]
@@ -58,3 +61,429 @@ def update_lines(lines: list[dict]) -> None:
         if not l["p2"]["pinned"]:
             l["p2"]["x"] -= offsetx
             l["p2"]["y"] -= offsety
+
+
+# Verlet simulation with points, pinned flags and distance constraints stored
+# in NumPy arrays. Points are moved all at once. Constraints are split into
+# batches where no two lines share a point, like even and odd lines in a
+# grid, so a batch is relaxed at once at full strength and the next batch
+# sees its moves. Each iteration converges like the update_lines loop.
+class Verlet:
+    def __init__(self, iterations: int = 3, capacity: int = 64) -> None:
+        """
+        Vectorized version of update_points and update_lines.
+
+        Methods:\n
+        \t.add_point() - adds point, returns its index
+        \t.add_line() - adds distance constraint between two points
+        \t.add_rect() - adds four points held together as a box
+        \t.step() - moves points and relaxes constraints"""
+        self.iterations = iterations
+
+        self.pos    = np.zeros((capacity, 2))
+        self.old    = np.zeros((capacity, 2))
+        self.pinned = np.zeros(capacity, dtype=bool)
+        self.num_points = 0
+
+        self.lines = np.zeros((capacity, 2), dtype=np.int64)
+        self.dists = np.zeros(capacity)
+        self.num_lines = 0
+        self.batches = None # line indices per batch, rebuilt after add_line
+
+
+    # Doubles the rows of the given arrays
+    def _grow(self, fields: tuple) -> None:
+        for field in fields:
+            old = getattr(self, field)
+            new = np.zeros((len(old) * 2,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+
+
+    def add_point(self, x: float, y: float, pinned: bool = False) -> int:
+        "Adds point at rest. Returns point index"
+        if self.num_points == len(self.pinned):
+            self._grow(("pos", "old", "pinned"))
+
+        index = self.num_points
+        self.pos[index] = (x, y)
+        self.old[index] = (x, y)
+        self.pinned[index] = pinned
+        self.num_points += 1
+        return index
+
+
+    def add_line(self, p1: int, p2: int, dist: float = None) -> int:
+        "Adds constraint between two point indices. Uses current distance if not given"
+        if self.num_lines == len(self.dists):
+            self._grow(("lines", "dists"))
+
+        if dist is None:
+            dx, dy = self.pos[p1] - self.pos[p2]
+            dist = sqrt(dx*dx + dy*dy)
+
+        index = self.num_lines
+        self.lines[index] = (p1, p2)
+        self.dists[index] = dist
+        self.num_lines += 1
+        self.batches = None
+        return index
+
+
+    def add_rect(self, x: float, y: float, w: float, h: float) -> tuple:
+        "Adds box with corners held by its edges and diagonals. Returns point indices"
+        p1 = self.add_point(x, y)
+        p2 = self.add_point(x + w, y)
+        p3 = self.add_point(x + w, y + h)
+        p4 = self.add_point(x, y + h)
+        for a, b in ((p1, p2), (p2, p3), (p3, p4), (p4, p1), (p1, p3), (p2, p4)):
+            self.add_line(a, b)
+
+        return (p1, p2, p3, p4)
+
+
+    # update_points for every point at once
+    def update_points(self, xsum_force: float = 0, ysum_force: float = 0) -> None:
+        n = self.num_points
+        pos = self.pos[:n]
+        free = ~self.pinned[:n]
+        vel = pos - self.old[:n]
+        self.old[:n] = pos
+        pos[free] += vel[free] + (xsum_force, ysum_force)
+
+
+    # Greedy graph colouring of the lines. Each line gets the first batch
+    # not used by another line on either of its points
+    def _build_batches(self) -> None:
+        taken = [set() for _ in range(self.num_points)] # batches per point
+        colours = np.zeros(self.num_lines, dtype=np.int64)
+        for index, (p1, p2) in enumerate(self.lines[:self.num_lines].tolist()):
+            used = taken[p1] | taken[p2]
+            colour = 0
+            while colour in used:
+                colour += 1
+            colours[index] = colour
+            taken[p1].add(colour)
+            taken[p2].add(colour)
+
+        self.batches = []
+        for colour in range(colours.max() + 1):
+            index = np.flatnonzero(colours == colour)
+            p1, p2 = self.lines[index, 0], self.lines[index, 1]
+            self.batches.append((p1, p2, self.dists[index]))
+
+
+    # update_lines for every line, one batch of lines without shared points at a time
+    def update_lines(self) -> None:
+        if self.batches is None:
+            self._build_batches()
+
+        pos = self.pos
+        free = [(~self.pinned[p1, None], ~self.pinned[p2, None]) for p1, p2, _ in self.batches]
+        for _ in range(self.iterations):
+            for (p1, p2, dists), (free1, free2) in zip(self.batches, free):
+                delta = pos[p1] - pos[p2]
+                dist = np.sqrt((delta * delta).sum(axis=1))
+                perc = np.divide(dists - dist, dist * 2, out=np.zeros_like(dist), where=dist > 0)
+                offset = delta * perc[:, None]
+
+                # No point appears twice in a batch, so plain indexing is safe
+                pos[p1] += offset * free1
+                pos[p2] -= offset * free2
+
+
+    def step(self, xsum_force: float = 0, ysum_force: float = 0) -> None:
+        "Moves all points and relaxes constraints `iterations` times"
+        self.update_points(xsum_force, ysum_force)
+        if self.num_lines:
+            self.update_lines()
+
+
+# Vector backed by one row of an EntityStore array. Reading and writing
+# x and y goes straight to the array, so all Vector methods keep working
+class ArrayVector(Vector):
+    __slots__ = ("store", "field", "index")
+
+    def __init__(self, store: object, field: str, index: int):
+        self.store = store
+        self.field = field
+        self.index = index
+
+    @property
+    def x(self):
+        return getattr(self.store, self.field)[self.index, 0]
+
+    @x.setter
+    def x(self, value):
+        getattr(self.store, self.field)[self.index, 0] = value
+
+    @property
+    def y(self):
+        return getattr(self.store, self.field)[self.index, 1]
+
+    @y.setter
+    def y(self, value):
+        getattr(self.store, self.field)[self.index, 1] = value
+
+
+# Entity compatible view of one entity in an EntityStore. Assigning a
+# Vector to pos, vel or acc copies its values into the store
+class EntityView:
+    __slots__ = ("store", "index", "spd", "sprite", "_pos", "_vel", "_acc", "_size")
+
+    def __init__(self, store: object, index: int):
+        self.store  = store
+        self.index  = index
+        self.spd    = Vector.ZERO()
+        self.sprite = None
+        self._pos   = ArrayVector(store, "pos", index)
+        self._vel   = ArrayVector(store, "vel", index)
+        self._acc   = ArrayVector(store, "acc", index)
+        self._size  = ArrayVector(store, "size", index)
+
+    pos  = property(lambda self: self._pos,  lambda self, v: self._pos.set_as(v.x, v.y))
+    vel  = property(lambda self: self._vel,  lambda self, v: self._vel.set_as(v.x, v.y))
+    acc  = property(lambda self: self._acc,  lambda self, v: self._acc.set_as(v.x, v.y))
+    size = property(lambda self: self._size, lambda self, v: self._size.set_as(v.x, v.y))
+
+    @property
+    def width(self):
+        return self.store.size[self.index, 0]
+
+    @property
+    def height(self):
+        return self.store.size[self.index, 1]
+
+    @property
+    def sleeping(self) -> bool:
+        return not self.store.awake[self.index]
+
+    @property
+    def layer(self) -> int:
+        return int(self.store.layer[self.index])
+
+    @layer.setter
+    def layer(self, value: int):
+        self.store.layer[self.index] = value
+
+    def rect(self) -> tuple:
+        pos = self.store.pos[self.index]
+        size = self.store.size[self.index]
+        return (pos[0], pos[1], size[0], size[1])
+
+
+# Structure of arrays storage for many entities. Every field is one
+# contiguous array with a row per entity, so all entities can be moved
+# with a single Euler step. Removed rows are reused by later entities.
+#
+# Sleeping entities are skipped by step() but stay in rects() as static
+# colliders, so awake entities still hit them. An entity sleeps while it is
+# outside the activity region, or once its speed has stayed under
+# sleep_speed for sleep_frames updates. Resting entities wake when a moving
+# entity overlaps them, or by wake(), wake_region() or wake_all().
+class EntityStore:
+    def __init__(self, capacity: int = 256, sleep_speed: float = 0.01, sleep_frames: int = 60) -> None:
+        """
+        Stores position, velocity, acceleration, size and layer of entities in NumPy arrays.
+
+        Methods:\n
+        \t.add() - adds entity, returns an Entity compatible view
+        \t.remove() - removes entity
+        \t.step() - moves all awake entities one Euler step
+        \t.rects() - returns (N, 4) rect array of entities
+        \t.collisions() - returns overlapping pairs with an awake entity
+        \t.set_region() - sets activity rect, entities outside it sleep
+        \t.update_sleep() - puts entities to sleep and wakes hit ones, call after collisions
+        \t.wake(), .wake_region(), .wake_all() - wakes resting entities"""
+        self.pos   = np.zeros((capacity, 2))
+        self.vel   = np.zeros((capacity, 2))
+        self.acc   = np.zeros((capacity, 2))
+        self.size  = np.zeros((capacity, 2))
+        self.layer = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.awake = np.zeros(capacity, dtype=bool)
+        self.still = np.zeros(capacity, dtype=np.int32) # updates spent at rest
+
+        self.views = [None] * capacity
+        self.count = 0 # rows in use, including removed ones
+        self.free  = []
+
+        self.region       = None
+        self.sleep_speed  = sleep_speed
+        self.sleep_frames = sleep_frames
+
+
+    def __len__(self) -> int:
+        return self.count - len(self.free)
+
+
+    def __iter__(self):
+        for index in np.flatnonzero(self.alive[:self.count]):
+            yield self.views[index]
+
+
+    # Doubles the size of every array
+    def _grow(self) -> None:
+        capacity = len(self.alive) * 2
+        for field in ("pos", "vel", "acc", "size", "layer", "alive", "awake", "still"):
+            old = getattr(self, field)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+
+        self.views.extend([None] * (capacity - len(self.views)))
+
+
+    def add(self, size: tuple, layer: int = 1) -> EntityView:
+        "Adds entity with given size. Returns view used like an `Entity`"
+        if self.free:
+            index = self.free.pop()
+        else:
+            if self.count == len(self.alive):
+                self._grow()
+            index = self.count
+            self.count += 1
+
+        self.pos[index]   = 0
+        self.vel[index]   = 0
+        self.acc[index]   = 0
+        self.size[index]  = size
+        self.layer[index] = layer
+        self.alive[index] = True
+        self.awake[index] = True
+        self.still[index] = 0
+
+        view = EntityView(self, index)
+        self.views[index] = view
+        return view
+
+
+    def remove(self, entity: EntityView) -> None:
+        "Removes entity. The view must not be used after"
+        index = entity.index
+        if not self.alive[index]:
+            return
+
+        self.alive[index] = False
+        self.awake[index] = False
+        self.vel[index]   = 0
+        self.acc[index]   = 0
+        self.views[index] = None
+        self.free.append(index)
+
+
+    # Euler integration for every awake entity at once
+    def step(self, dt: float = 1) -> None:
+        "Adds acceleration to velocity and velocity to position"
+        n = self.count
+        mask = self.awake[:n, None]
+        np.add(self.vel[:n], self.acc[:n] * dt, out=self.vel[:n], where=mask)
+        np.add(self.pos[:n], self.vel[:n] * dt, out=self.pos[:n], where=mask)
+
+
+    def rects(self, sleeping: bool = True) -> tuple:
+        """
+        Returns `(indices, rects)` where rects is an (N, 4) array of x, y, w, h
+        for every entity, or only awake ones without `sleeping`. Indices map
+        rows back to `.views`
+        """
+        mask = self.alive if sleeping else self.awake
+        indices = np.flatnonzero(mask[:self.count])
+        return indices, np.hstack((self.pos[indices], self.size[indices]))
+
+
+    # Awake entities are tested against every entity, so sleeping ones act
+    # as static colliders and pairs where both are sleeping are never tested
+    def collisions(self) -> tuple:
+        """
+        Returns `(i, j, sides)` where `.views[i]` overlaps `.views[j]` and
+        sides are SIDES codes relative to i. Each pair is returned once
+        """
+        indices, rects = self.rects()
+        awake = self.awake[indices]
+        a = rects[awake]
+        i, j = collision_rects_rects(a, rects)
+
+        first = indices[awake][i]
+        second = indices[j]
+        # Drops self pairs and awake pairs found from both sides
+        keep = (first != second) & (~self.awake[second] | (first < second))
+        sides = find_collision_rects_rects(a, rects, i[keep], j[keep])
+        return first[keep], second[keep], sides
+
+
+    # With a TilemapGroup moving the level, a region around the screen is
+    # (-group.offset_x - margin, -margin, width + margin*2, height + margin*2)
+    def set_region(self, x: float, y: float, w: float, h: float) -> None:
+        "Sets activity rect. Entities outside it sleep. None to disable"
+        self.region = None if x is None else (x, y, w, h)
+
+
+    # Counts updates at rest for awake entities and recomputes which
+    # entities are awake. Call after collisions have changed velocities
+    def update_sleep(self) -> None:
+        n = self.count
+        vel = self.vel[:n]
+        speed = (vel * vel).sum(axis=1)
+        resting = speed <= self.sleep_speed * self.sleep_speed
+        awake = self.awake[:n]
+
+        still = self.still[:n]
+        still[awake & resting] += 1
+        still[awake & ~resting] = 0
+
+        active = self.alive[:n] & (still < self.sleep_frames)
+        if self.region is not None:
+            active &= self._in_rect(self.region)
+
+        # Resting entities hit by a moving one wake up again. Entities that
+        # are awake but resting do not, so stacks can fall asleep together
+        moving = np.flatnonzero(active & ~resting)
+        idle = np.flatnonzero(self.alive[:n] & ~active)
+        if len(moving) and len(idle):
+            pos, size = self.pos[:n], self.size[:n]
+            _, j = collision_rects_rects(np.hstack((pos[moving], size[moving])), np.hstack((pos[idle], size[idle])))
+            hit = np.zeros(n, dtype=bool)
+            hit[idle[j]] = True
+            still[hit] = 0
+            if self.region is not None:
+                hit &= self._in_rect(self.region)
+            active |= hit
+
+        self.awake[:n] = active
+
+
+    # True for rows whose rect overlaps the given rect
+    def _in_rect(self, rect: tuple) -> np.ndarray:
+        n = self.count
+        x, y, w, h = rect
+        pos = self.pos[:n]
+        size = self.size[:n]
+        return ~((pos[:, 0] > x + w) | (pos[:, 1] > y + h) | (pos[:, 0] + size[:, 0] < x) | (pos[:, 1] + size[:, 1] < y))
+
+
+    def _wake(self, mask) -> None:
+        n = self.count
+        self.still[:n][mask] = 0
+        active = self.alive[:n].copy()
+        if self.region is not None:
+            active &= self._in_rect(self.region)
+        self.awake[:n] |= mask & active
+
+
+    def wake(self, entity: EntityView) -> None:
+        "Wakes entity if it is inside the activity region"
+        mask = np.zeros(self.count, dtype=bool)
+        mask[entity.index] = True
+        self._wake(mask)
+
+
+    def wake_region(self, x: float, y: float, w: float, h: float) -> None:
+        "Wakes entities overlapping the rect, like near an explosion or the player"
+        self._wake(self._in_rect((x, y, w, h)))
+
+
+    # Can be used as an event listener, events.push_event_listener(EVENT, store.wake_all)
+    def wake_all(self) -> None:
+        "Wakes every entity inside the activity region"
+        self._wake(np.ones(self.count, dtype=bool))
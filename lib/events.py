@@ -1,7 +1,10 @@
-# Version 1.0
+# Version 1.1
 # Event handler
 
-from config import FPS, append_loop
+# Note:
+# Ticks are fixed updates from config.append_update, UPDATE_RATE per second
+
+from config import UPDATE_RATE, append_update
 
 _queue = []
 _timeouts = []
@@ -16,7 +19,7 @@ def time_elapsed_seconds() -> int:
 
 
 def time_elapsed_ticks() -> int:
-    "Returns the total number of frames since start"
+    "Returns the total number of updates since start"
     return _ticks
 
 
@@ -26,7 +29,7 @@ def push_timed_event(time_seconds: int, callback, interval: bool = False) -> Non
     - param2 `function`: Callback method for event call
     - param3 `bool`: True if event should keep running after first call.
     """
-    _timed_event_listeners.append([time_seconds, _ticks + time_seconds * FPS, callback, interval])
+    _timed_event_listeners.append([time_seconds, _ticks + time_seconds * UPDATE_RATE, callback, interval])
 
 
 def get_event(event: int) -> bool:
@@ -100,21 +103,23 @@ def pop_event_listener(event: int) -> bool:
 
 def set_timeout(frames: int, callback) -> None:
     """
-    Queues new timeout event. Calls callback after n frames.
-    - param1 `int`: Number of frames before callback
+    Queues new timeout event. Calls callback after n updates.
+    - param1 `int`: Number of updates before callback
     - param2 `function`: Callback function (0 args)
     """
     _timeouts.append([frames, callback])
 
 
-def update_all(win, dt) -> None:
+# Takes *args so old loop callers passing (win, dt) still work
+def update_all(*args) -> None:
     """
     Calls event listeners and removes all queued events after.
-    Can be called at beginning or end of main loop. End is recommended.
+    Registered as a fixed update on import, so it should not also be
+    called from the main loop.
     """
     global _ticks, _seconds
     _ticks += 1
-    if _ticks % FPS == 0:
+    if _ticks % UPDATE_RATE == 0:
         _seconds += 1
 
     for listener in _event_listeners:
@@ -123,7 +128,7 @@ def update_all(win, dt) -> None:
     for listener in _timed_event_listeners:
         if _ticks == listener[1]:
             listener[2]()
-            listener[1] = _ticks + listener[0] * FPS
+            listener[1] = _ticks + listener[0] * UPDATE_RATE
             if not listener[3]:
                 _timed_event_listeners.remove(listener)
     
@@ -138,4 +143,4 @@ def update_all(win, dt) -> None:
         else: timeout[0] -= 1
 
 
-append_loop(update_all)
\ No newline at end of file
+append_update(update_all)
\ No newline at end of file
@@ -1,8 +1,9 @@
-# Version 1.1
+# Version 1.3
 # Font render
 
 from config import panic
-from pygame import image, Rect, transform
+from collections import OrderedDict
+from pygame import image, Rect, Surface, SRCALPHA, transform
 
 class Font:
     letters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 ,.:;!?()'-"
@@ -19,6 +20,9 @@ class Font:
         Methods:\n
         \t.load() - loads the individual images of the letters
         \t.render() - draws text, returns text rect tuple
+        \t.atlas() - returns glyph atlas for a scale
+        \t.render_cached() - returns text rendered to a shared surface
+        \t.size() - returns size of text on one line
         \t.typewrite() - writes a sentence letter by letter
         \t.reset() - reset typewriter"""
         
@@ -35,6 +39,13 @@ class Font:
 
         self.loaded = False
 
+        # Glyph atlases by (scale, spacing), (surface, {char: (source rect, advance)})
+        self.atlases = {}
+
+        # Rendered text surfaces, least recently used first
+        self.cache = OrderedDict()
+        self.cache_size = 256
+
     
     @staticmethod
     def clip_surface(surf, x, y, w, h) -> object:
@@ -59,8 +70,37 @@ class Font:
             else:
                 current_width += 1
         
+        self.atlases = {}
+        self.atlas()
         self.loaded = True
 
+
+    # Scales every glyph once and packs them side by side on one surface, so
+    # rendering only needs area blits. Other scales are built when first used
+    def atlas(self, scale: int = None) -> tuple:
+        "Returns `(surface, glyphs)` where glyphs maps char to `(rect, advance)`"
+        scale = self.scale if scale is None else scale
+        key = (scale, self.spacing)
+        found = self.atlases.get(key)
+        if found is not None:
+            return found
+
+        height = max((c.get_height() for c in self.chars.values()), default=0) * scale
+        width = sum(c.get_width() for c in self.chars.values()) * scale
+        surface = Surface((max(width, 1), max(height, 1)), SRCALPHA)
+
+        glyphs = {}
+        x = 0
+        for letter, char in self.chars.items():
+            w = char.get_width() * scale
+            h = char.get_height() * scale
+            surface.blit(transform.scale(char, (w, h)), (x, 0))
+            glyphs[letter] = (Rect(x, 0, w, h), w + self.spacing * scale)
+            x += w
+
+        self.atlases[key] = (surface, glyphs)
+        return surface, glyphs
+
     
     def render(self, win: object, pos: tuple, text: str, max_width: int = None, num_chars: int = None) -> tuple:
         "Returns `(x, y, w, h)`"
@@ -82,18 +122,18 @@ class Font:
         current_word_width = 0
         last_space_index = 0
 
-        # Places all the letter surfaces in the letters[] list
+        atlas, glyphs = self.atlas()
+
+        # Places the glyph rects and advances in the letters[] list
         for index, letter in enumerate(text):
-            pre_char = self.chars[letter]
-            scale = (pre_char.get_width() * self.scale, pre_char.get_height() * self.scale)
-            char = transform.scale(pre_char, scale)
-            letters.append(char)
+            glyph = glyphs[letter]
+            letters.append(glyph)
 
-            char_width = char.get_width() + (self.spacing * self.scale)
+            char_width = glyph[1]
             current_line_width += char_width
             current_word_width += char_width
 
-            height = char.get_height()
+            height = glyph[0].height
 
             if letter == " ":
                 last_space_index = index
@@ -108,24 +148,55 @@ class Font:
                     width = current_line_width - current_word_width
 
         # Draws the letters and adds new lines
-        for index, char in enumerate(letters):
+        for index, (rect, advance) in enumerate(letters):
             if index >= max_chars:
                 break
 
             if index in breakpoint_index_list:
-                y += char.get_height() + (self.line_height * self.scale)
+                y += rect.height + (self.line_height * self.scale)
                 height = y # 
                 x_offset = 0
             
             else: # skips space characters when rendering new lines
-                win.blit(char, (x + x_offset, y))
-                x_offset += char.get_width() + (self.spacing * self.scale)
-                height = char.get_height()
+                win.blit(atlas, (x + x_offset, y), rect)
+                x_offset += advance
+                height = rect.height
 
         # returns size of string
         return (x, y, x_offset, height)
 
 
+    def size(self, text: str) -> tuple:
+        "Returns `(w, h)` of text on a single line without rendering"
+        if not self.loaded:
+            panic("Font used before loading")
+
+        # Atlas is one glyph tall at the current scale
+        atlas, glyphs = self.atlas()
+        return (sum(glyphs[letter][1] for letter in text), atlas.get_height())
+
+
+    # Renders text once to its own surface and keeps it for later calls with
+    # the same text, scale and spacing. The surface is shared, so it must not be drawn on
+    def render_cached(self, text: str) -> Surface:
+        "Returns surface with text rendered on a single line"
+        key = (text, self.scale, self.spacing)
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.cache.move_to_end(key)
+            return surf
+
+        w, h = self.size(text)
+        surf = Surface((max(w, 1), max(h, 1)), SRCALPHA)
+        self.render(surf, (0, 0), text)
+
+        self.cache[key] = surf
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return surf
+
+
     def typewrite(self, win: object, pos: tuple, text: str, width: int = None, callback = None) -> tuple:
         self.frames += 1
 
@@ -1,21 +1,65 @@
 # Basic lighting
 
-from pygame import Surface, SRCALPHA, transform
-from math import sqrt
+from pygame import Surface, SRCALPHA, BLEND_RGBA_MAX, BLEND_RGBA_MIN, BLEND_RGBA_SUB, draw, surfarray, transform
+from collections import OrderedDict
+from random import randint
+import numpy as np
+
+# Shadow opacity (0-1) for distance from the center (0-1)
+falloffs = {
+    "linear":    lambda t: t,
+    "quadratic": lambda t: t * t,
+    "sqrt":      np.sqrt,
+    "smooth":    lambda t: t * t * (3 - 2 * t),
+}
+
+# Masks by (radius, curve). Lights with the same size share one surface
+_circles = {}
+
+# Creates a circlular inverse shadow with specified radius. The whole alpha
+# channel is computed as one array. The surface is shared, do not draw on it
+def create_circle(radius: int, curve: str = "linear") -> Surface:
+    key = (radius, curve)
+    if key in _circles:
+        return _circles[key]
 
-# Creates a circlular inverse shadow with specified radius
-def create_circle(radius: int) -> Surface:
     width = radius * 2
-    surf = Surface((width, width)).convert_alpha()
-    for rx in range(width):
-        for ry in range(width):
-            dx = radius - rx
-            dy = radius - ry
-            dist = sqrt(dx*dx + dy*dy)
-            opacity = 255 * dist / radius
-            if opacity > 255: opacity = 255
-            surf.set_at((rx, ry), (0, 0, 0, opacity))
-    
+    d = radius - np.arange(width, dtype=np.float64)
+    dist = np.sqrt(d[:, None] ** 2 + d[None, :] ** 2)
+    opacity = falloffs[curve](np.minimum(dist / radius, 1)) * 255
+
+    surf = Surface((width, width), SRCALPHA)
+    alpha = surfarray.pixels_alpha(surf)
+    alpha[:] = opacity.astype(np.uint8)
+    del alpha
+
+    _circles[key] = surf
+    return surf
+
+
+# Scaled masks by (radius, curve, w, h), least recently used first. Sizes
+# are rounded to SCALE_STEP pixels so pulsing lights reuse a small set
+SCALE_STEP  = 2
+SCALE_CACHE = 128
+_scaled = OrderedDict()
+
+# Returns create_circle mask scaled to size. The surface is shared, do not draw on it
+def scaled_circle(radius: int, size: tuple, curve: str = "linear") -> Surface:
+    w = max(int(round(size[0] / SCALE_STEP)) * SCALE_STEP, SCALE_STEP)
+    h = max(int(round(size[1] / SCALE_STEP)) * SCALE_STEP, SCALE_STEP)
+    key = (radius, curve, w, h)
+
+    surf = _scaled.get(key)
+    if surf is not None:
+        _scaled.move_to_end(key)
+        return surf
+
+    circle = create_circle(radius, curve)
+    surf = circle if circle.get_size() == (w, h) else transform.smoothscale(circle, (w, h))
+    _scaled[key] = surf
+    if len(_scaled) > SCALE_CACHE:
+        _scaled.popitem(last=False)
+
     return surf
 
 
@@ -37,10 +81,11 @@ def draw_circle(dest: Surface, circle: Surface, pos: tuple) -> None:
 
 # Class for methods with self referencing
 class Circle:
-    def __init__(self, window_size: tuple, radius: int) -> None:
+    def __init__(self, window_size: tuple, radius: int, curve: str = "linear") -> None:
         self.buffer = Surface((window_size[0], window_size[1]), SRCALPHA)
         self.radius = radius
-        self.circle = create_circle(radius)
+        self.curve  = curve
+        self.circle = create_circle(radius, curve)
 
         # For pulsate
         self.psize = [self.circle.get_width(), self.circle.get_height()]
@@ -57,8 +102,9 @@ class Circle:
         win.blit(self.buffer, (0, 0))
 
     
-    # Draws circle as a pulsating ellipse with given speed
-    def pulsate(self, win: Surface, pos: tuple) -> None:
+    # Steps the pulse and returns the mask for its current size. Can be
+    # given to a Lightmap instead of drawing with pulsate()
+    def pulse_mask(self) -> Surface:
         self.svel += self.speed * self.dir
         if abs(self.svel) > self.max_vel:
             self.svel = self.max_vel * self.dir
@@ -68,5 +114,228 @@ class Circle:
 
         if self.psize[0] / 2 > self.circle.get_width(): self.dir = -1
         if self.psize[0] / 2 < self.circle.get_width(): self.dir = 1
-        size = (int(self.psize[0]), int(self.psize[1]))
-        self.draw(win, pos, transform.smoothscale(self.circle, size))
\ No newline at end of file
+        return scaled_circle(self.radius, self.psize, self.curve)
+
+
+    # Returns the mask randomly grown or shrunk by up to amount pixels
+    def flicker_mask(self, amount: int = 4) -> Surface:
+        size = self.circle.get_width() + randint(-amount, amount)
+        return scaled_circle(self.radius, (size, size), self.curve)
+
+
+    # Draws circle as a pulsating ellipse with given speed
+    def pulsate(self, win: Surface, pos: tuple) -> None:
+        self.draw(win, pos, self.pulse_mask())
+
+
+    # Draws circle with its size changing randomly every call
+    def flicker(self, win: Surface, pos: tuple, amount: int = 4) -> None:
+        self.draw(win, pos, self.flicker_mask(amount))
+
+
+# Collects every light of a frame into one shadow buffer and draws it with a
+# single blit. Lights only touch the buffer inside their own rect, and only
+# the rects lit last frame are reset, so cost follows the lit area.
+#
+# Blend modes:
+#   max - overlapping lights show the brightest of them
+#   add - overlapping lights add up and get brighter
+class Lightmap:
+    def __init__(self, window_size: tuple, darkness: int = 255, blend: str = "max") -> None:
+        """
+        Methods:\n
+        \t.add() - adds light mask centered at pos for this frame
+        \t.draw() - draws all added lights to window and clears them"""
+        self.buffer   = Surface((window_size[0], window_size[1]), SRCALPHA)
+        self.darkness = darkness
+        self.blend    = blend
+        self.lights   = []
+        self.dirty    = []
+
+        self.buffer.fill((0, 0, 0, darkness))
+
+        # Inverted masks used for additive blending, by id of the mask
+        self._inverted = OrderedDict()
+
+
+    # Mask with alpha flipped so it holds light instead of shadow, then
+    # subtracting it from the buffer adds the light
+    def _invert(self, mask: Surface) -> Surface:
+        key = id(mask)
+        found = self._inverted.get(key)
+        if found is not None and found[0] is mask:
+            self._inverted.move_to_end(key)
+            return found[1]
+
+        inverted = mask.copy()
+        alpha = surfarray.pixels_alpha(inverted)
+        np.subtract(255, alpha, out=alpha)
+        del alpha
+
+        self._inverted[key] = (mask, inverted)
+        if len(self._inverted) > 64:
+            self._inverted.popitem(last=False)
+        return inverted
+
+
+    def add(self, mask: Surface, pos: tuple) -> None:
+        "Adds light mask, like from create_circle(), centered at pos"
+        self.lights.append((mask, pos))
+
+
+    def draw(self, win: Surface) -> None:
+        for rect in self.dirty:
+            self.buffer.fill((0, 0, 0, self.darkness), rect)
+        self.dirty.clear()
+
+        for mask, pos in self.lights:
+            dest = (pos[0] - mask.get_width()/2, pos[1] - mask.get_height()/2)
+            if self.blend == "add":
+                rect = self.buffer.blit(self._invert(mask), dest, special_flags=BLEND_RGBA_SUB)
+            else:
+                rect = self.buffer.blit(mask, dest, special_flags=BLEND_RGBA_MIN)
+            self.dirty.append(rect)
+
+        self.lights.clear()
+        win.blit(self.buffer, (0, 0))
+
+
+# Finds the points a light at origin can see. A ray is cast just before, at
+# and just after every segment end, and each ray stops at the nearest
+# segment. The rays are tested against all segments as one array.
+def visibility_polygon(origin: tuple, segments: np.ndarray, radius: float) -> list:
+    "Returns points of the visible area around origin, ordered by angle"
+    ox, oy = origin
+
+    # Square around the light so every ray hits something
+    box = np.array([
+        (ox - radius, oy - radius, ox + radius, oy - radius),
+        (ox + radius, oy - radius, ox + radius, oy + radius),
+        (ox + radius, oy + radius, ox - radius, oy + radius),
+        (ox - radius, oy + radius, ox - radius, oy - radius),
+    ], dtype=np.float64)
+    segments = np.vstack((np.asarray(segments, dtype=np.float64).reshape(-1, 4), box))
+
+    ends = segments.reshape(-1, 2)
+    angles = np.arctan2(ends[:, 1] - oy, ends[:, 0] - ox)
+    angles = np.unique(np.concatenate((angles - 1e-4, angles, angles + 1e-4)))
+
+    dx = np.cos(angles)[:, None]
+    dy = np.sin(angles)[:, None]
+    ax = segments[None, :, 0] - ox
+    ay = segments[None, :, 1] - oy
+    sx = segments[None, :, 2] - segments[None, :, 0]
+    sy = segments[None, :, 3] - segments[None, :, 1]
+
+    # Ray origin + t * d against segment a + u * s
+    denom = dx * sy - dy * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (ax * sy - ay * sx) / denom
+        u = (ax * dy - ay * dx) / denom
+
+    hit = (denom != 0) & (t >= 0) & (u >= 0) & (u <= 1)
+    t = np.where(hit, t, np.inf).min(axis=1)
+    return list(zip(ox + dx[:, 0] * t, oy + dy[:, 0] * t))
+
+
+# Casts shadows from the solid tiles of a Tilemap. The edges between solid
+# and empty tiles are built once, with edges in a line merged, and kept in
+# a grid of buckets so a light only tests the edges near it. Edges are
+# rebuilt when the tilemap version changes.
+class ShadowCaster:
+    def __init__(self, tilemap: object, cell_size: int = 8) -> None:
+        """
+        `tilemap`: Tilemap to take solid tiles from
+        `cell_size`: width and height of an edge bucket in tiles
+
+        Methods:\n
+        \t.mask() - returns light mask with shadows cut out
+        \t.add() - adds shadowed light to a Lightmap"""
+        self.tilemap   = tilemap
+        self.cell_size = cell_size
+        self.version   = None
+        self.segments  = np.zeros((0, 4))
+        self.buckets   = {}
+
+
+    # Finds runs of edges along one axis. Edge i of line n exists where
+    # the solid flag changes between tile n-1 and n
+    @staticmethod
+    def _runs(solid: np.ndarray) -> list:
+        changed = solid[:-1] != solid[1:]
+        runs = []
+        for line, edges in enumerate(changed):
+            padded = np.concatenate(([False], edges, [False])).astype(np.int8)
+            starts = np.flatnonzero(np.diff(padded) == 1)
+            stops  = np.flatnonzero(np.diff(padded) == -1)
+            runs.extend((line, start, stop) for start, stop in zip(starts, stops))
+        return runs
+
+
+    def _build(self) -> None:
+        t = self.tilemap
+        grid = np.frombuffer(t.grid, dtype=np.uint8 if t.grid.itemsize == 1 else np.uint16)
+        solid = np.zeros((t.rows + 2, t.cols + 2), dtype=bool)
+        solid[1:-1, 1:-1] = (grid < len(t.tiles)).reshape(t.rows, t.cols)
+        solid = solid[:, 1:-1], solid[1:-1, :]
+
+        segments = []
+        for row, start, stop in self._runs(solid[0]):
+            segments.append((start * t.tile_w, row * t.tile_h, stop * t.tile_w, row * t.tile_h))
+        for col, start, stop in self._runs(solid[1].T):
+            segments.append((col * t.tile_w, start * t.tile_h, col * t.tile_w, stop * t.tile_h))
+        self.segments = np.array(segments, dtype=np.float64).reshape(-1, 4)
+
+        cell_w = t.tile_w * self.cell_size
+        cell_h = t.tile_h * self.cell_size
+        self.buckets = {}
+        for index, (x1, y1, x2, y2) in enumerate(self.segments):
+            for cy in range(int(min(y1, y2) // cell_h), int(max(y1, y2) // cell_h) + 1):
+                for cx in range(int(min(x1, x2) // cell_w), int(max(x1, x2) // cell_w) + 1):
+                    self.buckets.setdefault((cx, cy), []).append(index)
+
+        self.version = t.version
+
+
+    def segments_near(self, x: float, y: float, w: float, h: float) -> np.ndarray:
+        "Returns (N, 4) array of edges in map coordinates near the rect"
+        if self.version != self.tilemap.version:
+            self._build()
+
+        cell_w = self.tilemap.tile_w * self.cell_size
+        cell_h = self.tilemap.tile_h * self.cell_size
+        found = set()
+        for cy in range(int(y // cell_h), int((y + h) // cell_h) + 1):
+            for cx in range(int(x // cell_w), int((x + w) // cell_w) + 1):
+                found.update(self.buckets.get((cx, cy), ()))
+
+        return self.segments[sorted(found)]
+
+
+    # Shadow surface is opaque except for the visible polygon, and taking
+    # the max alpha with the light mask darkens everything the light cannot see
+    def mask(self, light: Surface, pos: tuple) -> Surface:
+        "Returns copy of light mask centered at pos with occluded areas dark"
+        w, h = light.get_size()
+        ox = pos[0] - self.tilemap.offset_x
+        oy = pos[1] - self.tilemap.offset_y
+        radius = max(w, h) / 2
+
+        segments = self.segments_near(ox - radius, oy - radius, radius * 2, radius * 2)
+        if len(segments) == 0:
+            return light
+
+        left = ox - w/2
+        top  = oy - h/2
+        points = [(x - left, y - top) for x, y in visibility_polygon((ox, oy), segments, radius)]
+
+        surf = Surface((w, h), SRCALPHA)
+        surf.fill((0, 0, 0, 255))
+        draw.polygon(surf, (0, 0, 0, 0), points)
+        surf.blit(light, (0, 0), special_flags=BLEND_RGBA_MAX)
+        return surf
+
+
+    def add(self, lightmap: Lightmap, light: Surface, pos: tuple) -> None:
+        "Adds light to lightmap with shadows from the tilemap"
+        lightmap.add(self.mask(light, pos), pos)
@@ -0,0 +1,113 @@
+# Version 1.0
+# Binary tilemap files
+
+# Note:
+# Layout of a binary map file, all values little endian
+#   magic    4 bytes  b"TMAP"
+#   version  u8
+#   width    u8       bytes per tile value, 1 or 2
+#   padding  2 bytes
+#   rows     u32
+#   cols     u32
+#   data     rows * cols tile values stored row by row
+# Empty tiles are stored as the largest value for the tile width.
+#
+# Convert text maps from tilemap_editor with:
+#   python lib/mapfile.py <file.map> [dest.tmap]
+
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC   = b"TMAP"
+VERSION = 1
+HEADER  = struct.Struct("<4sBBxxII")
+EMPTY   = {1: 0xff, 2: 0xffff}
+
+# Tile symbols used in text map files, same as tilemap_editor
+letters = "0123456789abcdefghijklmnopqrstuvwxyz"
+nil_tile = len(letters) - 1
+
+
+def is_binary(filename: str) -> bool:
+    "Returns true if the file starts with the binary map header"
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# Maps the file copy-on-write, so the grid can be changed at runtime
+# without writing back to the file and without reading it up front
+def load(filename: str) -> tuple:
+    """
+    Returns `(rows, cols, grid)` where grid is a writable memoryview of
+    the tile values. Raises `ValueError` for invalid files.
+    """
+    with open(filename, "rb") as f:
+        size = f.seek(0, 2)
+        if size < HEADER.size:
+            raise ValueError(f"{filename}: not a binary map file")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, version, width, rows, cols = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{filename}: not a binary map file")
+    if version > VERSION:
+        raise ValueError(f"{filename}: unsupported map version {version}")
+    if width not in EMPTY:
+        raise ValueError(f"{filename}: invalid tile width {width}")
+    if size < HEADER.size + rows * cols * width:
+        raise ValueError(f"{filename}: map data is truncated")
+
+    view = memoryview(data)[HEADER.size:HEADER.size + rows * cols * width]
+    if width == 1:
+        return rows, cols, view
+
+    # memoryview uses native byte order, so big endian machines need a copy
+    if sys.byteorder == "big":
+        values = array("H", view)
+        values.byteswap()
+        return rows, cols, memoryview(values)
+
+    return rows, cols, view.cast("H")
+
+
+def save(filename: str, rows: int, cols: int, grid, width: int = None) -> None:
+    """
+    Writes tile values to a binary map file. `width` is the number of bytes
+    per tile and is picked from the largest value if not given.
+    """
+    if width is None:
+        width = 1 if max(grid, default=0) <= EMPTY[1] else 2
+
+    values = array("B" if width == 1 else "H", grid)
+    if width == 2 and sys.byteorder == "big":
+        values.byteswap()
+
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, rows, cols))
+        f.write(values.tobytes())
+
+
+def convert(src: str, dest: str = None) -> str:
+    "Converts a text map file to a binary one. Returns the new filename"
+    raw = open(src, "r").read().split(".")
+    rows = int(raw[0])
+    cols = int(raw[1])
+
+    grid = [letters.index(char) for char in raw[2][:rows * cols]]
+    grid = [EMPTY[1] if i == nil_tile else i for i in grid]
+
+    if dest is None:
+        dest = src.rsplit(".", 1)[0] + ".tmap"
+
+    save(dest, rows, cols, grid, 1)
+    return dest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: mapfile.py <file.map> [dest.tmap]")
+        sys.exit(1)
+
+    print(convert(*sys.argv[1:3]))
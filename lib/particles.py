@@ -1,16 +1,37 @@
 # Particle effects
 
-from pygame import Surface, draw
+from pygame import Surface, SRCALPHA, surfarray
 from math import sqrt
-from random import randrange, random
+from random import random
+import numpy as np
 
+from config import append_update
 from lib.vector import Vector
 from lib.font import Font
 
-pool = []
+# Particles and effects move once per fixed update, registered below.
+# Drawing stays in the frame loop, append_loop(particles.update)
+def step(dt: float = None) -> None:
+    pool.step()
+    system.update()
+
 
 def update(win, dt) -> None:
-    for p in pool: p.update(win)
+    system.track_frame(dt)
+    pool.draw(win)
+    system.draw(win)
+
+
+def stats() -> dict:
+    "Returns counters for live, dropped and recycled particles and effects"
+    return {
+        "live": system.count,
+        "dropped": system.dropped,
+        "recycled": system.recycled,
+        "effects": pool.live,
+        "effects_dropped": pool.dropped,
+        "effects_recycled": pool.recycled,
+    }
 
 
 def randvel(px: bool = False, py: bool = False) -> tuple:
@@ -24,39 +45,191 @@ def randvel(px: bool = False, py: bool = False) -> tuple:
     return [x, y]
 
 
+# Fixed number of slots for effects like WordBounce. Free slots are kept
+# in a list so adding and removing never searches. Effects added while
+# every slot is taken are dropped.
+class EmitterPool:
+    def __init__(self, capacity: int = 256) -> None:
+        self.slots    = [None] * capacity
+        self.free     = list(range(capacity - 1, -1, -1))
+        self.used     = set() # slots that have held an effect before
+        self.live     = 0
+        self.dropped  = 0
+        self.recycled = 0
+
+
+    def add(self, effect: object) -> bool:
+        "Adds effect with step() and draw(win) methods. Returns False if the pool is full"
+        if not self.free:
+            self.dropped += 1
+            effect._slot = None
+            return False
+
+        slot = self.free.pop()
+        if slot in self.used:
+            self.recycled += 1
+        self.used.add(slot)
+
+        self.slots[slot] = effect
+        effect._slot = slot
+        self.live += 1
+        return True
+
+
+    def remove(self, effect: object) -> None:
+        slot = effect._slot
+        if slot is None or self.slots[slot] is not effect:
+            return
+
+        self.slots[slot] = None
+        self.free.append(slot)
+        self.live -= 1
+
+
+    def step(self) -> None:
+        for effect in self.slots:
+            if effect is not None: effect.step()
+
+
+    def draw(self, win) -> None:
+        for effect in self.slots:
+            if effect is not None: effect.draw(win)
+
+
+# Single pixel particles stored in preallocated arrays. Live particles are
+# always the first `count` rows, so one update moves all of them and dead
+# particles are removed by packing the live ones to the front.
+#
+# Capacity is the global particle budget. Emission counts are scaled down
+# once the system is more than lod_start full, and when the smoothed frame
+# time is over target_ms, so heavy scenes lose detail instead of stalling.
+class ParticleSystem:
+    def __init__(self, capacity: int = 50000, lod_start: float = 0.5, min_lod: float = 0.1, target_ms: float = 1000 / 60) -> None:
+        """
+        Methods:\n
+        \t.emit() - adds particles, returns number added
+        \t.update() - moves particles and removes dead ones
+        \t.draw() - draws all particles as pixels
+        \t.lod() - returns current emission scale (0-1)"""
+        self.capacity = capacity
+        self.count = 0
+
+        self.lod_start = lod_start
+        self.min_lod   = min_lod
+        self.target_ms = target_ms
+        self.frame_ms  = 0
+
+        self.peak     = 0 # highest row ever used, rows below it are reused
+        self.dropped  = 0
+        self.recycled = 0
+
+        # Velocity and gravity are stored pre multiplied by particle speed
+        self.pos  = np.zeros((capacity, 2))
+        self.vel  = np.zeros((capacity, 2))
+        self.grv  = np.zeros(capacity)
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.col  = np.zeros((capacity, 3), dtype=np.uint8)
+
+
+    def track_frame(self, dt: float) -> None:
+        "Adds frame time in ms to the smoothed frame time"
+        self.frame_ms += (dt - self.frame_ms) * 0.1
+
+
+    def lod(self) -> float:
+        "Returns how much of requested emissions are currently let through"
+        scale = 1.0
+        pressure = self.count / self.capacity
+        if pressure > self.lod_start:
+            scale -= (pressure - self.lod_start) / (1 - self.lod_start)
+
+        if self.frame_ms > self.target_ms:
+            scale *= self.target_ms / self.frame_ms
+
+        return max(scale, self.min_lod)
+
+
+    def emit(self, x, y, amount: int, grv: float = 0, lifetime: int = 100, speed: float = 1, col: tuple = (255, 255, 255)) -> int:
+        "Adds particles at (x, y) moving in random directions. Returns number added"
+        requested = amount
+        amount = min(int(amount * self.lod() + 0.5), self.capacity - self.count)
+        self.dropped += requested - max(amount, 0)
+        if amount <= 0:
+            return 0
+
+        # Same directions as randvel()
+        vel = np.random.random((amount, 2)) - 0.5
+        vel /= np.maximum(np.sqrt((vel * vel).sum(axis=1)), 1e-9)[:, None]
+
+        start = self.count
+        end = start + amount
+        self.pos[start:end]  = (x, y)
+        self.vel[start:end]  = vel * speed
+        self.grv[start:end]  = grv * speed
+        self.life[start:end] = np.random.randint(lifetime//2, max(lifetime, lifetime//2 + 1), amount)
+        self.col[start:end]  = col[:3]
+        self.count = end
+
+        self.recycled += max(min(end, self.peak) - start, 0)
+        self.peak = max(self.peak, end)
+        return amount
+
+
+    def update(self) -> None:
+        n = self.count
+        self.vel[:n, 1] += self.grv[:n]
+        self.pos[:n] += self.vel[:n]
+        self.life[:n] -= 1
+
+        alive = self.life[:n] > 0
+        live = int(alive.sum())
+        if live == n:
+            return
+
+        for field in (self.pos, self.vel, self.grv, self.life, self.col):
+            field[:live] = field[:n][alive]
+        self.count = live
+
+
+    # Writes all visible particles straight into the surface pixels
+    def draw(self, win: Surface) -> None:
+        n = self.count
+        if n == 0:
+            return
+
+        x = self.pos[:n, 0].astype(np.int64)
+        y = self.pos[:n, 1].astype(np.int64)
+        w, h = win.get_size()
+        visible = (x >= 0) & (y >= 0) & (x < w) & (y < h)
+        x, y = x[visible], y[visible]
+
+        pixels = surfarray.pixels3d(win)
+        pixels[x, y] = self.col[:n][visible]
+        del pixels
+
+        if win.get_flags() & SRCALPHA:
+            alpha = surfarray.pixels_alpha(win)
+            alpha[x, y] = 255
+            del alpha
+
+
+system = ParticleSystem()
+pool = EmitterPool()
+append_update(step)
+
+
 class Explosion:
     def __init__(self, x, y, grv: int = 0, lifetime: int = 100, amount: int = 20, speed: int = 1, col: tuple = (255, 255, 255)) -> None:
-        self.grv = grv
-        self.spd = speed
-        self.col = col
-
-        self.particles = []
-        for _ in range(amount):
-            p = [x, y, randvel(), randrange(lifetime//2, lifetime)]
-            self.particles.append(p)
-        
-        pool.append(self)
-    
-    def update(self, win) -> None:
-        for p in self.particles:
-            p[2][1] += self.grv
-            p[0] += p[2][0] * self.spd
-            p[1] += p[2][1] * self.spd
-            p[3] -= 1
-            if p[3] <= 0:
-                self.particles.remove(p)
-
-            draw.rect(win, self.col, (p[0], p[1], 1, 1))
-        
-        if len(self.particles) == 0:
-            pool.remove(self)
+        "Emits particles into the shared particle system"
+        system.emit(x, y, amount, grv, lifetime, speed, col)
 
 
+# Floating text. The word is rendered once through the font text cache, so
+# every WordBounce with the same word shares one surface and only blits it
 class WordBounce:
     font = Font("./assets/font_sheet.png")
-    buffer = Surface((100, 100))
 
-    def __init__(self, pos: tuple, word: str, grv: int = 0, lifetime: int = 60) -> None:
+    def __init__(self, pos: tuple, word: str, grv: int = 0, lifetime: int = 60, fade: bool = False) -> None:
         if not WordBounce.font.loaded:
             print("Forgot WordBounce.font.load()")
             quit()
@@ -65,11 +238,14 @@ class WordBounce:
         self.vel = randvel(py=True)
         self.grv = grv
         self.word = word
-        self.word_length = self.font.render(self.buffer, (0, 0), self.word)[2]
+        self.surf = self.font.render_cached(word)
+        self.word_length = self.surf.get_width()
         self.lifetime = lifetime
-        pool.append(self)
+        self.max_lifetime = lifetime
+        self.fade = fade
+        pool.add(self)
     
-    def update(self, win) -> None:
+    def step(self) -> None:
         self.vel[1] += self.grv
         self.pos.x  += self.vel[0]
         self.pos.y  += self.vel[1]
@@ -77,5 +253,12 @@ class WordBounce:
         if self.lifetime <= 0:
             pool.remove(self)
 
+    def draw(self, win) -> None:
+        # Surface is shared, so alpha is set before every blit
+        alpha = 255
+        if self.fade:
+            alpha = max(0, 255 * self.lifetime // self.max_lifetime)
+
+        self.surf.set_alpha(alpha)
         x = self.pos.x - self.word_length/2
-        self.font.render(win, (x, self.pos.y), self.word)
\ No newline at end of file
+        win.blit(self.surf, (x, self.pos.y))
\ No newline at end of file
@@ -0,0 +1,145 @@
+# Version 1.0
+# Component based entity registry
+
+# Note:
+# Entities are plain ids. Components are any objects and are stored by
+# their type, so an entity has at most one component of each type.
+
+from config import append_loop, append_update
+
+# Dense storage for one component type. Components are packed in a list
+# with the owning entity at the same index in a second list. Removing
+# moves the last component into the hole so the lists never have gaps.
+class _Pool:
+    __slots__ = ("entities", "components", "sparse")
+
+    def __init__(self) -> None:
+        self.entities   = []
+        self.components = []
+        self.sparse     = {} # entity: index
+
+
+    def add(self, entity: int, component: object) -> None:
+        index = self.sparse.get(entity)
+        if index is not None:
+            self.components[index] = component
+            return
+
+        self.sparse[entity] = len(self.entities)
+        self.entities.append(entity)
+        self.components.append(component)
+
+
+    def remove(self, entity: int) -> None:
+        index = self.sparse.pop(entity, None)
+        if index is None:
+            return
+
+        last_entity = self.entities.pop()
+        last_component = self.components.pop()
+        if last_entity != entity:
+            self.entities[index] = last_entity
+            self.components[index] = last_component
+            self.sparse[last_entity] = index
+
+
+class Registry:
+    def __init__(self) -> None:
+        """
+        Stores entity components in one dense pool per type and runs systems
+        over the entities that have the components they need.
+
+        Methods:\n
+        \t.create() - creates entity with components, returns entity id
+        \t.destroy() - removes entity and all its components
+        \t.add() - adds or replaces component of entity
+        \t.remove() - removes component type from entity
+        \t.get() - returns component of type or None
+        \t.query() - iterates entities with all given component types
+        \t.system() - runs function for matching entities every frame"""
+        self.pools   = {}
+        self.next_id = 0
+
+
+    def _pool(self, cls: type) -> _Pool:
+        pool = self.pools.get(cls)
+        if pool is None:
+            pool = self.pools[cls] = _Pool()
+        return pool
+
+
+    def create(self, *components) -> int:
+        "Returns new entity id with given components"
+        entity = self.next_id
+        self.next_id += 1
+        for component in components:
+            self.add(entity, component)
+        return entity
+
+
+    def destroy(self, entity: int) -> None:
+        for pool in self.pools.values():
+            pool.remove(entity)
+
+
+    def add(self, entity: int, component: object) -> None:
+        self._pool(type(component)).add(entity, component)
+
+
+    def remove(self, entity: int, cls: type) -> None:
+        pool = self.pools.get(cls)
+        if pool: pool.remove(entity)
+
+
+    def get(self, entity: int, cls: type) -> object:
+        pool = self.pools.get(cls)
+        if pool is None:
+            return None
+
+        index = pool.sparse.get(entity)
+        return None if index is None else pool.components[index]
+
+
+    def has(self, entity: int, *types) -> bool:
+        for cls in types:
+            pool = self.pools.get(cls)
+            if pool is None or entity not in pool.sparse:
+                return False
+        return True
+
+
+    # Walks the smallest pool and looks up the other types, so the cost
+    # follows the rarest component instead of the number of entities
+    def query(self, *types):
+        "Yields `(entity, component, ...)` for entities with every given type"
+        pools = [self.pools.get(cls) for cls in types]
+        if not pools or None in pools:
+            return
+
+        smallest = min(pools, key=lambda p: len(p.entities))
+        # Copied so systems can add and destroy entities while iterating
+        for entity in smallest.entities[:]:
+            found = [entity]
+            for pool in pools:
+                index = pool.sparse.get(entity)
+                if index is None: break
+                found.append(pool.components[index])
+            else:
+                yield tuple(found)
+
+
+    def system(self, func, *types, layer: int = 0, fixed: bool = False) -> None:
+        """
+        Registers `func` to run for every entity with all the given component
+        types. Runs as a config loop, `func(win, dt, entity, *components)`.
+        With `fixed` it runs as a fixed update instead, `func(dt, entity, *components)`.
+        """
+        if fixed:
+            def update(dt) -> None:
+                for found in self.query(*types): func(dt, *found)
+            append_update(update, layer)
+
+        else:
+            def loop(win, dt) -> None:
+                for found in self.query(*types): func(win, dt, *found)
+            append_loop(loop, layer)
@@ -1,7 +1,8 @@
 import pygame
 import os
 
-FPS = 60
+from config import UPDATE_RATE
+from lib.events import time_elapsed_ticks
 
 # Shorthand for getting image
 def get_image(filename: str, size: tuple = None) -> pygame.Surface:
@@ -73,12 +74,15 @@ def get_sprite_rows(filename: str, size: tuple, scale: int = 1) -> list[list]:
 
 
 # Object for storing animation values
+# Frames advance with fixed updates (UPDATE_RATE per second), not with draw
+# calls, so animations keep their speed when frames are slow
 class Animation:
     def __init__(self, sprites: list, fps: int) -> None:
         "Animation player for rendering sprites with animations"
         self.ticks = 0
+        self.last_tick = time_elapsed_ticks()
         self.fps = fps
-        self.frame_swap = FPS // fps
+        self.frame_swap = max(UPDATE_RATE // fps, 1)
         self.on_frame = 0
         self.sprites = sprites
         self.num_frames = len(sprites)
@@ -87,30 +91,36 @@ class Animation:
         self.keyframes = []
     
 
-    # Runs through the frames and swaps frame when specified ticks have passed
+    # Runs through the frames and swaps frame when specified ticks have passed.
+    # Catches up on every fixed update since the last draw
     def draw(self, win: object, pos: tuple, dir: int = 1) -> bool:
         "Draw sprite to window. Renders first sprite in list if not playing an animation. Returns True if animation is done."
+        now = time_elapsed_ticks()
+        updates = now - self.last_tick
+        self.last_tick = now
+
         if self.running:
-            self.ticks += 1
-            # Reset tick counter
-            if self.ticks >= FPS:
-                self.ticks = 0
-
-            # Goto nest frame
-            if self.ticks % self.frame_swap == 0:
-                self.on_frame += 1
-            
-            # Reset animation
-            if self.on_frame > len(self.sprites) - 1:
-                if self.once:
-                    self.running = False
-                    return True
-
-                self.on_frame = 0
-            
-            # Call keyframes
-            for keyframe in self.keyframes:
-                if self.on_frame == keyframe[0]: keyframe[1]()
+            for _ in range(updates):
+                self.ticks += 1
+                # Reset tick counter
+                if self.ticks >= UPDATE_RATE:
+                    self.ticks = 0
+
+                # Goto nest frame
+                if self.ticks % self.frame_swap == 0:
+                    self.on_frame += 1
+                
+                # Reset animation
+                if self.on_frame > len(self.sprites) - 1:
+                    if self.once:
+                        self.running = False
+                        return True
+
+                    self.on_frame = 0
+                
+                # Call keyframes
+                for keyframe in self.keyframes:
+                    if self.on_frame == keyframe[0]: keyframe[1]()
         else:
             self.on_frame = 0
         
@@ -126,6 +136,7 @@ class Animation:
         self.running = True
         self.once = once
         self.ticks = 0
+        self.last_tick = time_elapsed_ticks()
 
 
     # Stops animation
@@ -147,7 +158,7 @@ class Animation:
     def set_fps(self, new_fps) -> None:
         "Sets new fps for animation. Resets .frame_swap too"
         self.fps = new_fps
-        self.frame_swap = FPS // self.fps
+        self.frame_swap = max(UPDATE_RATE // self.fps, 1)
 
 
 
@@ -1,26 +1,62 @@
-# Version 2.2
+# Version 3.2
 # Read and render tilemaps
 
 # Note:
 # Tilemap file formating as per tilemap_editor v1.2
+# or binary map files as per lib/mapfile v1.0
 
 from config import panic
+from lib import mapfile
+from lib.collision import SIDES
+from lib.vector import Vector
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pygame
 
+# Tile symbols used in text map files. Index in string is the tile value
+letters = mapfile.letters
+# Maps symbols to tile values and every other byte to 0xff
+_decode = bytes(letters.index(chr(c)) if chr(c) in letters else 0xff for c in range(256))
+
 # Stores tile data and sprites
 class Tilemap:
-    def __init__(self, map: str, tiles: list, size: tuple) -> None:
+    def __init__(self, map: str, tiles: list, size: tuple, cell_size: int = 4, chunk_size: int = 16, cache_budget: int = 8 * 1024 * 1024, merge: bool = False, keep_values: bool = True, raise_errors: bool = False) -> None:
         """
-        `map`: path to tilemap file
+        `map`: path to tilemap file, text or binary
         `tiles`: list of `pygame.Surface`. Leave empty for collsion maps
         `size`: tilesize
+        `cell_size`: width and height of a collision grid cell in tiles
+        `merge`: merge adjacent tiles into larger colliders
+        `keep_values`: only merge tiles with the same value
+        `chunk_size`: width and height of a render chunk in tiles
+        `cache_budget`: max bytes of rendered chunks kept when off-screen
+        `raise_errors`: raise `ValueError` for invalid maps instead of panicking
         """
-        raw = map
-        if type(map) == str:
-            raw = open(map, "r").read().split(".")
-        self.rows = int(raw[0])
-        self.cols = int(raw[1])
-        self.data = [char for char in raw[2]]
+        self.raise_errors = raise_errors
+
+        # Decoded tile values stored row by row. Binary maps are memory
+        # mapped, text maps are decoded to one byte per tile
+        if type(map) == str and mapfile.is_binary(map):
+            try:
+                self.rows, self.cols, self.grid = mapfile.load(map)
+            except ValueError as e:
+                self._error(str(e))
+            self.empty = mapfile.EMPTY[self.grid.itemsize]
+
+        else:
+            raw = map
+            if type(map) == str:
+                raw = open(map, "r").read().split(".")
+            self.rows = int(raw[0])
+            self.cols = int(raw[1])
+            data = bytearray(raw[2][:self.rows * self.cols].encode().translate(_decode))
+            if len(data) < self.rows * self.cols:
+                self._error("Tilemap data is truncated")
+            if 0xff in data:
+                self._error("Invalid symbol in tilemap file")
+            self.grid = memoryview(data)
+            self.empty = len(letters) - 1
 
         self.tiles    = tiles
         self.offset_x = 0
@@ -28,24 +64,203 @@ class Tilemap:
 
         self.tile_w = size[0]
         self.tile_h = size[1]
-        self.buffer = pygame.Surface((self.cols * self.tile_w, self.rows * self.tile_h), pygame.SRCALPHA)
 
-        # List of all tiles that can be collided with
-        # Stored as [tile_val, x, y]
-        letters = "0123456789abcdefghijklmnopqrstuvwxyz"
-        if len(self.tiles) >= len(letters):
-            panic("Too many tiles for Tilemap. Update tile index list")
+        if len(self.tiles) > self.empty:
+            self._error("Too many tiles for Tilemap. Update tile index list")
 
         if len(self.tiles) == 0:
-            panic("No tiles in Tilemap tile list")
-
-        self.valid_tiles = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                i = letters.index(self.data[col + row * self.cols])
-                if i >= len(tiles): continue
-                self.valid_tiles.append([i, col * self.tile_w, row * self.tile_h])
-                self.buffer.blit(self.tiles[i], (col * self.tile_w, row * self.tile_h))
+            self._error("No tiles in Tilemap tile list")
+
+        # Rendered chunks are created when first in view and kept in
+        # least recently drawn order so old ones can be evicted
+        self.chunk_size   = chunk_size
+        self.chunks_x     = -(-self.cols // chunk_size)
+        self.chunks_y     = -(-self.rows // chunk_size)
+        self.chunks       = OrderedDict()
+        self.cache_budget = cache_budget
+        self.cache_bytes  = 0
+
+        self.cell_size   = cell_size
+        self.merge       = merge
+        self.keep_values = keep_values
+        self._build_index()
+
+        # Increased on every tile change so derived data knows to rebuild
+        self.version = 0
+
+
+    # Maps loaded off the main thread must not panic, since it quits
+    # pygame while the game is still drawing
+    def _error(self, msg: str) -> None:
+        if self.raise_errors:
+            raise ValueError(msg)
+        panic(msg)
+
+
+    # List of all tiles that can be collided with
+    # Stored as [tile_val, x, y]
+    @property
+    def valid_tiles(self) -> list:
+        num_tiles = len(self.tiles)
+        return [
+            [i, (index % self.cols) * self.tile_w, (index // self.cols) * self.tile_h]
+            for index, i in enumerate(self.grid) if i < num_tiles
+        ]
+
+
+    # Builds a uniform grid over the map where each cell holds the colliders
+    # overlapping it, so collision checks only look at nearby tiles
+    def _build_index(self) -> None:
+        self.cells_x = -(-self.cols // self.cell_size)
+        self.cells_y = -(-self.rows // self.cell_size)
+        if not self.merge:
+            self.cells = [
+                self._build_cell(cx, cy)
+                for cy in range(self.cells_y)
+                for cx in range(self.cells_x)
+            ]
+            return
+
+        # Merged colliders are meshed over the whole map and can span many
+        # cells. The same list is stored in each of them
+        self.cells = [[] for _ in range(self.cells_x * self.cells_y)]
+        for collider in self._mesh(0, 0, self.cols, self.rows):
+            self._insert(collider)
+
+
+    # Returns the colliders of a cell, one per tile, stored as [tile_val, x, y, w, h]
+    def _build_cell(self, cx: int, cy: int) -> list:
+        col0 = cx * self.cell_size
+        row0 = cy * self.cell_size
+        col1 = min(col0 + self.cell_size, self.cols)
+        row1 = min(row0 + self.cell_size, self.rows)
+        num_tiles = len(self.tiles)
+        colliders = []
+
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                i = self.grid[col + row * self.cols]
+                if i >= num_tiles: continue
+                colliders.append([i, col * self.tile_w, row * self.tile_h, self.tile_w, self.tile_h])
+
+        return colliders
+
+
+    # Returns merged colliders for the tiles in the given range, stored as
+    # [tile_val, x, y, w, h]. Found with greedy meshing: each rect is grown to
+    # the right as far as possible, then down while the full row below matches.
+    # With `allowed`, only tiles in that set of (col, row) are meshed
+    def _mesh(self, col0: int, row0: int, col1: int, row1: int, allowed: set = None) -> list:
+        num_tiles = len(self.tiles)
+        width = col1 - col0
+        used = bytearray(width * (row1 - row0))
+        colliders = []
+
+        def mergeable(value, col, row) -> bool:
+            if used[col - col0 + (row - row0) * width]: return False
+            if allowed is not None and (col, row) not in allowed: return False
+            i = self.grid[col + row * self.cols]
+            return i < num_tiles and (i == value or not self.keep_values)
+
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                i = self.grid[col + row * self.cols]
+                if i >= num_tiles or not mergeable(i, col, row): continue
+
+                end = col + 1
+                while end < col1 and mergeable(i, end, row):
+                    end += 1
+
+                bottom = row + 1
+                while bottom < row1 and all(mergeable(i, c, bottom) for c in range(col, end)):
+                    bottom += 1
+
+                for r in range(row - row0, bottom - row0):
+                    used[r * width + col - col0:r * width + end - col0] = b"\x01" * (end - col)
+                colliders.append([i, col * self.tile_w, row * self.tile_h, (end - col) * self.tile_w, (bottom - row) * self.tile_h])
+
+        return colliders
+
+
+    # Returns the range of cells (cx0, cy0, cx1, cy1) overlapped by a collider
+    def _collider_cells(self, collider: list) -> tuple:
+        cell_w = self.tile_w * self.cell_size
+        cell_h = self.tile_h * self.cell_size
+        _, x, y, w, h = collider
+        return x // cell_w, y // cell_h, (x + w - 1) // cell_w, (y + h - 1) // cell_h
+
+
+    def _insert(self, collider: list) -> None:
+        cx0, cy0, cx1, cy1 = self._collider_cells(collider)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                self.cells[cx + cy * self.cells_x].append(collider)
+
+
+    def _remove(self, collider: list) -> None:
+        cx0, cy0, cx1, cy1 = self._collider_cells(collider)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = self.cells[cx + cy * self.cells_x]
+                cell[:] = [c for c in cell if c is not collider]
+
+
+    # Removes the merged colliders containing or next to a tile and meshes
+    # their tiles again, so a change never touches the rest of the map
+    def _remesh(self, col: int, row: int) -> None:
+        x = col * self.tile_w
+        y = row * self.tile_h
+        cx = col // self.cell_size
+        cy = row // self.cell_size
+
+        touching = {}
+        for ny in range(max(cy - 1, 0), min(cy + 2, self.cells_y)):
+            for nx in range(max(cx - 1, 0), min(cx + 2, self.cells_x)):
+                for c in self.cells[nx + ny * self.cells_x]:
+                    # Rects sharing an edge or corner with the tile
+                    if c[1] <= x + self.tile_w and c[1] + c[3] >= x and c[2] <= y + self.tile_h and c[2] + c[4] >= y:
+                        touching[id(c)] = c
+
+        allowed = {(col, row)}
+        for c in touching.values():
+            self._remove(c)
+            c0 = c[1] // self.tile_w
+            r0 = c[2] // self.tile_h
+            allowed.update((cc, r) for r in range(r0, r0 + c[4] // self.tile_h) for cc in range(c0, c0 + c[3] // self.tile_w))
+
+        col0 = min(c for c, _ in allowed)
+        row0 = min(r for _, r in allowed)
+        col1 = max(c for c, _ in allowed) + 1
+        row1 = max(r for _, r in allowed) + 1
+        for collider in self._mesh(col0, row0, col1, row1, allowed):
+            self._insert(collider)
+
+
+    # Returns all indexed tiles in the cells overlapped by the given rect.
+    # Rect is in screen space, so the map offset is removed first
+    def _query_index(self, x, y, w, h) -> list:
+        cell_w = self.tile_w * self.cell_size
+        cell_h = self.tile_h * self.cell_size
+        x -= self.offset_x
+        y -= self.offset_y
+
+        # Tiles touching the edge of the rect also collide, so the range
+        # is widened by one tile on the left and top
+        x0 = max(int((x - self.tile_w) // cell_w), 0)
+        y0 = max(int((y - self.tile_h) // cell_h), 0)
+        x1 = min(int((x + w) // cell_w), self.cells_x - 1)
+        y1 = min(int((y + h) // cell_h), self.cells_y - 1)
+
+        found = []
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                found.extend(self.cells[cx + cy * self.cells_x])
+
+        # Merged colliders are stored in every cell they overlap
+        if self.merge:
+            found = list({id(c): c for c in found}.values())
+
+        return found
 
     
     # Sets the drawing and collision offset for tilemap
@@ -54,10 +269,66 @@ class Tilemap:
         self.offset_y = y
 
 
+    # Renders the tiles of a chunk to a new surface
+    def _render_chunk(self, cx: int, cy: int) -> pygame.Surface:
+        col0 = cx * self.chunk_size
+        row0 = cy * self.chunk_size
+        col1 = min(col0 + self.chunk_size, self.cols)
+        row1 = min(row0 + self.chunk_size, self.rows)
+
+        surf = pygame.Surface(((col1 - col0) * self.tile_w, (row1 - row0) * self.tile_h), pygame.SRCALPHA)
+        num_tiles = len(self.tiles)
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                i = self.grid[col + row * self.cols]
+                if i >= num_tiles: continue
+                surf.blit(self.tiles[i], ((col - col0) * self.tile_w, (row - row0) * self.tile_h))
+
+        return surf
+
+
+    # Gets rendered chunk from cache, rendering it if needed
+    def _get_chunk(self, cx: int, cy: int) -> pygame.Surface:
+        key = (cx, cy)
+        surf = self.chunks.get(key)
+        if surf is None:
+            surf = self._render_chunk(cx, cy)
+            self.chunks[key] = surf
+            self.cache_bytes += surf.get_width() * surf.get_height() * surf.get_bytesize()
+        else:
+            self.chunks.move_to_end(key)
+
+        return surf
+
+
+    # Removes least recently drawn chunks until the cache fits the budget.
+    # Chunks drawn this frame are at the end and are never evicted
+    def _evict_chunks(self, visible: int) -> None:
+        while self.cache_bytes > self.cache_budget and len(self.chunks) > visible:
+            _, surf = self.chunks.popitem(last=False)
+            self.cache_bytes -= surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
     # Draws tilemap from tilemap object
     def draw(self, win: object) -> tuple:
-        """Draws tilemap. Returns map dimensions"""
-        win.blit(self.buffer, (self.offset_x, self.offset_y))
+        """Draws the chunks of the tilemap that are in view"""
+        chunk_w = self.tile_w * self.chunk_size
+        chunk_h = self.tile_h * self.chunk_size
+        view_w, view_h = win.get_size()
+
+        x0 = max(int(-self.offset_x // chunk_w), 0)
+        y0 = max(int(-self.offset_y // chunk_h), 0)
+        x1 = min(int((view_w - self.offset_x) // chunk_w), self.chunks_x - 1)
+        y1 = min(int((view_h - self.offset_y) // chunk_h), self.chunks_y - 1)
+
+        visible = 0
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                pos = (cx * chunk_w + self.offset_x, cy * chunk_h + self.offset_y)
+                win.blit(self._get_chunk(cx, cy), pos)
+                visible += 1
+
+        self._evict_chunks(visible)
 
 
     # Finds the side of collision between tile and object.
@@ -70,14 +341,17 @@ class Tilemap:
 
         colliding_tiles = []
 
-        for tile in self.valid_tiles:
+        for tile in self._query_index(x, y, w, h):
             tile_x = tile[1] + self.offset_x
             tile_y = tile[2] + self.offset_y
 
             top    = tile_y > y + h
             left   = tile_x > x + w
-            right  = tile_x + self.tile_w < x
-            bottom = tile_y + self.tile_h < y
+            tile_w = tile[3]
+            tile_h = tile[4]
+
+            right  = tile_x + tile_w < x
+            bottom = tile_y + tile_h < y
 
             if top or left or right or bottom:
                 continue
@@ -89,31 +363,230 @@ class Tilemap:
             if abs(tile_y - (y + h)) <= collision_threshold and vel.y >= 0:
                 side = "top"
 
-            elif abs((tile_x + self.tile_w) - x) <= collision_threshold and vel.x <= 0:
+            elif abs((tile_x + tile_w) - x) <= collision_threshold and vel.x <= 0:
                 side = "right"
 
             elif abs(tile_x - (x + w)) <= collision_threshold and vel.x >= 0:
                 side = "left"
 
-            elif abs((tile_y + self.tile_h) - y) <= collision_threshold and vel.y < 0:
+            elif abs((tile_y + tile_h) - y) <= collision_threshold and vel.y < 0:
                 side = "bottom"
 
-            colliding_tiles.append((side, tile_value, tile_x, tile_y, self.tile_w, self.tile_h))
+            colliding_tiles.append((side, tile_value, tile_x, tile_y, tile_w, tile_h))
 
+        # Keep map order (top to bottom, left to right) across cells
+        colliding_tiles.sort(key=lambda t: (t[3], t[2]))
         return colliding_tiles
 
 
+    # Same checks as check_tile_collision for many objects in one pass.
+    # The tiles each rect can touch are laid out as one (N, rows, cols)
+    # block read straight from the tile grid. Always per tile, also when merged
+    def check_tile_collisions(self, rects, vels) -> tuple:
+        """
+        `rects`: (N, 4) array of x, y, w, h
+        `vels`: (N, 2) array of velocity x, y\n
+        Returns tuple of arrays with one entry per collision:\n
+        \t(rect index, side, tile value, x, y)\n
+        Side is an index into `collision.SIDES`. Tiles are `tile_w` by `tile_h`.
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        vels  = np.asarray(vels, dtype=np.float64).reshape(-1, 2)
+        grid  = np.frombuffer(self.grid, dtype=np.uint8 if self.grid.itemsize == 1 else np.uint16)
+
+        x = rects[:, 0] - self.offset_x
+        y = rects[:, 1] - self.offset_y
+        w = rects[:, 2]
+        h = rects[:, 3]
+
+        # Tile range per rect, including tiles touching the edges
+        col0 = np.clip(np.ceil(x / self.tile_w - 1), 0, None).astype(np.int64)
+        row0 = np.clip(np.ceil(y / self.tile_h - 1), 0, None).astype(np.int64)
+        col1 = np.clip(np.floor((x + w) / self.tile_w), None, self.cols - 1).astype(np.int64)
+        row1 = np.clip(np.floor((y + h) / self.tile_h), None, self.rows - 1).astype(np.int64)
+        span_w = col1 - col0 + 1
+        span_h = row1 - row0 + 1
+
+        empty = np.empty(0, dtype=np.int64)
+        if len(rects) == 0 or span_w.max() <= 0 or span_h.max() <= 0:
+            return empty, empty, empty, empty.astype(np.float64), empty.astype(np.float64)
+
+        steps_x = np.arange(span_w.max())
+        steps_y = np.arange(span_h.max())
+        cols = col0[:, None] + steps_x
+        rows = row0[:, None] + steps_y
+        in_range = (steps_y < span_h[:, None])[:, :, None] & (steps_x < span_w[:, None])[:, None, :]
+
+        index = np.where(in_range, rows[:, :, None] * self.cols + cols[:, None, :], 0)
+        solid = in_range & (grid[index] < len(self.tiles))
+        n, l, k = np.nonzero(solid)
+
+        tile_x = cols[n, k] * self.tile_w + self.offset_x
+        tile_y = rows[n, l] * self.tile_h + self.offset_y
+        values = grid[index[n, l, k]].astype(np.int64)
+        x, y, w, h = rects[n].T
+        vx, vy = vels[n].T
+
+        # Same edge test as the single rect version to guard against rounding
+        hit = ~((tile_y > y + h) | (tile_x > x + w) | (tile_x + self.tile_w < x) | (tile_y + self.tile_h < y))
+        n, tile_x, tile_y, values = n[hit], tile_x[hit], tile_y[hit], values[hit]
+        x, y, w, h, vx, vy = x[hit], y[hit], w[hit], h[hit], vx[hit], vy[hit]
+
+        collision_threshold = 6
+        side = np.select([
+            (np.abs(tile_y - (y + h)) <= collision_threshold) & (vy >= 0),
+            (np.abs((tile_x + self.tile_w) - x) <= collision_threshold) & (vx <= 0),
+            (np.abs(tile_x - (x + w)) <= collision_threshold) & (vx >= 0),
+            (np.abs((tile_y + self.tile_h) - y) <= collision_threshold) & (vy < 0),
+        ], [SIDES.index("top"), SIDES.index("right"), SIDES.index("left"), SIDES.index("bottom")], 0)
+
+        return n, side, values, tile_x, tile_y
+
+
+    # Swept AABB test against every collider near the path of the rect.
+    # Finds the fraction of vel the rect can move before touching a tile
+    def sweep(self, x, y, w, h, vel: Vector) -> tuple:
+        """
+        Moves rect `(x, y, w, h)` along `vel` until it hits a tile.\n
+        Returns tuple:\n
+        \t(time of impact 0-1, contact normal, resolved position)\n
+        Time is 1 and normal is zero if nothing was hit. To slide along the
+        tile, remove the velocity along the normal and sweep the remaining time.
+        """
+        vx = vel.x
+        vy = vel.y
+        toi = 1.0
+        normal = Vector.ZERO()
+
+        # Bounding box of the rect at the start and end of the move
+        bx = min(x, x + vx)
+        by = min(y, y + vy)
+        for tile in self._query_index(bx, by, w + abs(vx), h + abs(vy)):
+            tile_x = tile[1] + self.offset_x
+            tile_y = tile[2] + self.offset_y
+            tile_w = tile[3]
+            tile_h = tile[4]
+
+            # Entry and exit times on each axis. A still axis either always
+            # overlaps or never does
+            if vx > 0:
+                entry_x = (tile_x - (x + w)) / vx
+                exit_x  = (tile_x + tile_w - x) / vx
+            elif vx < 0:
+                entry_x = (tile_x + tile_w - x) / vx
+                exit_x  = (tile_x - (x + w)) / vx
+            elif x + w <= tile_x or x >= tile_x + tile_w:
+                continue
+            else:
+                entry_x, exit_x = float("-inf"), float("inf")
+
+            if vy > 0:
+                entry_y = (tile_y - (y + h)) / vy
+                exit_y  = (tile_y + tile_h - y) / vy
+            elif vy < 0:
+                entry_y = (tile_y + tile_h - y) / vy
+                exit_y  = (tile_y - (y + h)) / vy
+            elif y + h <= tile_y or y >= tile_y + tile_h:
+                continue
+            else:
+                entry_y, exit_y = float("-inf"), float("inf")
+
+            entry = max(entry_x, entry_y)
+            exit  = min(exit_x, exit_y)
+
+            # Tiles the rect already overlaps at the start are ignored
+            if entry > exit or entry < 0 or entry >= toi:
+                continue
+
+            toi = entry
+            if entry_x > entry_y:
+                normal.set_as(-1 if vx > 0 else 1, 0)
+            else:
+                normal.set_as(0, -1 if vy > 0 else 1)
+
+        return toi, normal, Vector(x + vx * toi, y + vy * toi)
+
+
+    # Returns the tile value at the given column and row
+    def get_tile(self, col: int, row: int) -> int:
+        "Returns tile value at (col, row). None if empty or outside the map"
+        if col < 0 or row < 0 or col >= self.cols or row >= self.rows:
+            return None
+
+        i = self.grid[col + row * self.cols]
+        return i if i < len(self.tiles) else None
+
+
     # Returns true if x and y is overlapping a tile in the map
     # Ignores tile values in ignore tuple
     def tile_at(self, x: int, y: int, ignore: tuple = ()) -> bool:
         "Returns true if a tile is at (x, y)"
-        for tile in self.valid_tiles:
-            tile_x = tile[1] + self.offset_x
-            tile_y = tile[2] + self.offset_y
-            if x == tile_x and y == tile_y and tile[0] not in ignore:
-                return True
-        
-        return False
+        x -= self.offset_x
+        y -= self.offset_y
+        if x % self.tile_w or y % self.tile_h:
+            return False
+
+        i = self.get_tile(int(x // self.tile_w), int(y // self.tile_h))
+        return i is not None and i not in ignore
+
+
+    # Looks up every grid position covered by the rect directly
+    def tiles_in_rect(self, x, y, w, h) -> list:
+        """
+        Returns list of tuples for tiles overlapping the rect:\n
+        \t(tile value, x, y)
+        """
+        x -= self.offset_x
+        y -= self.offset_y
+        col0 = max(int(x // self.tile_w), 0)
+        row0 = max(int(y // self.tile_h), 0)
+        col1 = min(int(-(-(x + w) // self.tile_w)), self.cols)
+        row1 = min(int(-(-(y + h) // self.tile_h)), self.rows)
+
+        found = []
+        num_tiles = len(self.tiles)
+        for row in range(row0, row1):
+            start = row * self.cols
+            for col in range(col0, col1):
+                i = self.grid[start + col]
+                if i >= num_tiles: continue
+                found.append((i, col * self.tile_w + self.offset_x, row * self.tile_h + self.offset_y))
+
+        return found
+
+
+    # Changes a single tile in place. Only the collision cell holding the
+    # tile and the tile area of its rendered chunk are rebuilt
+    def set_tile(self, col: int, row: int, value: int) -> None:
+        "Sets tile at (col, row) to value. Values outside the tile list are empty"
+        if col < 0 or row < 0 or col >= self.cols or row >= self.rows:
+            return
+
+        index = col + row * self.cols
+        if self.grid[index] == value:
+            return
+
+        self.grid[index] = value
+        self.version += 1
+        if self.merge:
+            self._remesh(col, row)
+        else:
+            cx = col // self.cell_size
+            cy = row // self.cell_size
+            self.cells[cx + cy * self.cells_x] = self._build_cell(cx, cy)
+
+        # Chunks not in the cache are rendered with the new tile when drawn
+        chunk = self.chunks.get((col // self.chunk_size, row // self.chunk_size))
+        if chunk is not None:
+            pos = ((col % self.chunk_size) * self.tile_w, (row % self.chunk_size) * self.tile_h)
+            chunk.fill((0, 0, 0, 0), (pos[0], pos[1], self.tile_w, self.tile_h))
+            if value < len(self.tiles):
+                chunk.blit(self.tiles[value], pos)
+
+
+    def clear_tile(self, col: int, row: int) -> None:
+        "Removes tile at (col, row)"
+        self.set_tile(col, row, self.empty)
 
 
 # Group of tilemaps for a level map
@@ -122,12 +595,9 @@ class TilemapGroup:
         self.tilemaps = [t for t in args]
         self.offset_x = 0
 
-    
-    def draw_tilemaps(self, player: object, win: object) -> None:
-        "Handles rendering of tilemap based on pos of player given"
-        # offset stops once tilemap end is in view
-        width = win.get_width()
 
+    # Moves the group with the player. Offset stops once tilemap end is in view
+    def _scroll(self, player: object, width: int) -> None:
         player_offset = player.pos.x - width/2
         end_right = -width * (len(self.tilemaps) - 1)
 
@@ -141,6 +611,90 @@ class TilemapGroup:
             self.offset_x -= player.vel.x
             player.pos.x = width/2
 
+    
+    def draw_tilemaps(self, player: object, win: object) -> None:
+        "Handles rendering of tilemap based on pos of player given"
+        width = win.get_width()
+        self._scroll(player, width)
+
         for index, tilemap in enumerate(self.tilemaps):
             tilemap._set_offset(self.offset_x + width * index, 0)
-            tilemap.draw(win)
\ No newline at end of file
+            tilemap.draw(win)
+
+
+# Group of tilemap files where only the maps near the player are kept in
+# memory. Maps are loaded on a background thread before they come into view
+class StreamingTilemapGroup(TilemapGroup):
+    def __init__(self, files: list, tiles: list, size: tuple, radius: int = 1, **kwargs) -> None:
+        """
+        `files`: paths to tilemap files, one screen each from left to right
+        `tiles`, `size`, `kwargs`: passed to each `Tilemap`
+        `radius`: number of screens kept loaded on each side of the current one.
+        The next screen is always loaded since it is partly in view
+        """
+        super().__init__()
+        self.files    = files
+        self.tilemaps = [None for _ in files]
+        self.radius   = radius
+
+        self._args    = (tiles, size)
+        self._kwargs  = dict(kwargs, raise_errors=True)
+        self._loaded  = set()
+        self._loading = {}
+        self._worker  = ThreadPoolExecutor(max_workers=1)
+
+
+    # Queues loading of maps within radius and releases the ones outside
+    def _stream(self, screen: int) -> None:
+        first = max(screen - self.radius, 0)
+        last  = min(screen + max(self.radius, 1), len(self.files) - 1)
+
+        for index in [i for i in self._loaded if i < first or i > last]:
+            self.tilemaps[index] = None
+            self._loaded.remove(index)
+
+        for index in [i for i in self._loading if i < first or i > last]:
+            self._loading.pop(index).cancel()
+
+        for index in range(first, last + 1):
+            if index in self._loaded or index in self._loading: continue
+            self._loading[index] = self._worker.submit(Tilemap, self.files[index], *self._args, **self._kwargs)
+
+        for index, future in list(self._loading.items()):
+            if future.done(): self._finish(index)
+
+
+    # Moves a loaded map into the group. Waits for it if still loading.
+    # Errors from the worker are raised here, on the main thread
+    def _finish(self, index: int) -> None:
+        try:
+            self.tilemaps[index] = self._loading.pop(index).result()
+        except ValueError as e:
+            panic(f"{self.files[index]}: {e}")
+        self._loaded.add(index)
+
+
+    def draw_tilemaps(self, player: object, win: object) -> None:
+        "Handles loading and rendering of tilemaps based on pos of player given"
+        width = win.get_width()
+        self._scroll(player, width)
+
+        screen = int(-self.offset_x // width)
+        self._stream(screen)
+
+        # Maps in view must be drawn even if the worker is behind
+        for index in (screen, screen + 1):
+            if index in self._loading: self._finish(index)
+
+        for index in self._loaded:
+            tilemap = self.tilemaps[index]
+            tilemap._set_offset(self.offset_x + width * index, 0)
+            tilemap.draw(win)
+
+
+    def close(self) -> None:
+        "Stops the loading thread and releases all maps"
+        self._worker.shutdown(wait=False, cancel_futures=True)
+        self.tilemaps = [None for _ in self.files]
+        self._loaded.clear()
+        self._loading.clear()
@@ -1,10 +1,14 @@
-# Version 1.1
+# Version 1.2
 # Standard 2D vector
 
 from math import sqrt
 
 # Simple vector class
+# Slotted so instances carry no dict. Operators like + and * return a new
+# vector, in place operators like += and the lowercase methods change self
 class Vector:
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -21,11 +25,50 @@ class Vector:
     def __sub__(self, other):
         return Vector(self.x - other.x, self.y - other.y)
 
-    def __mult__(self, other):
-        return Vector(self.x * other.x, self.y * other.y)
+    # Multiplies by vector component wise or by a number
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return Vector(self.x * other.x, self.y * other.y)
+        return Vector(self.x * other, self.y * other)
+
+    def __rmul__(self, other):
+        return Vector(self.x * other, self.y * other)
+
+    def __truediv__(self, other):
+        if isinstance(other, Vector):
+            return Vector(self.x / other.x, self.y / other.y)
+        return Vector(self.x / other, self.y / other)
+
+    def __neg__(self):
+        return Vector(-self.x, -self.y)
 
-    def __div__(self, other):
-        return Vector(self.x / other.x, self.y / other.y)
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, other):
+        if isinstance(other, Vector):
+            self.x *= other.x
+            self.y *= other.y
+        else:
+            self.x *= other
+            self.y *= other
+        return self
+
+    def __itruediv__(self, other):
+        if isinstance(other, Vector):
+            self.x /= other.x
+            self.y /= other.y
+        else:
+            self.x /= other
+            self.y /= other
+        return self
     
     def __repr__(self) -> str:
         return f"x: {self.x}, y: {self.y}"
@@ -46,8 +89,12 @@ class Vector:
         self.x /= other.x
         self.y /= other.y
 
+    def scale(self, n):
+        self.x *= n
+        self.y *= n
+
     def normalize(self):
-        hyp = sqrt(self.x**2 + self.y**2)
+        hyp = sqrt(self.x*self.x + self.y*self.y)
         if hyp != 0:
             self.x /= hyp
             self.y /= hyp
@@ -57,7 +104,18 @@ class Vector:
         self.y = 0
 
     def get_mag(self) -> float:
-        return sqrt(self.x**2 + self.y**2)
+        return sqrt(self.x*self.x + self.y*self.y)
+
+    def length_squared(self) -> float:
+        return self.x*self.x + self.y*self.y
+
+    def dot(self, other) -> float:
+        return self.x * other.x + self.y * other.y
+
+    # Moves self towards other by t (0-1)
+    def lerp(self, other, t):
+        self.x += (other.x - self.x) * t
+        self.y += (other.y - self.y) * t
 
     def tup(self):
         return (self.x, self.y)
@@ -79,16 +137,18 @@ class Vector:
     
     @staticmethod
     def Normalize(vec) -> object:
-        new_vec = vec.copy()
-        hyp = sqrt(new_vec.x**2 + new_vec.y**2)
+        hyp = sqrt(vec.x*vec.x + vec.y*vec.y)
         if hyp != 0:
-            new_vec.x /= hyp
-            new_vec.y /= hyp
-        
-        return new_vec
+            return Vector(vec.x / hyp, vec.y / hyp)
+
+        return Vector(vec.x, vec.y)
+
+    @staticmethod
+    def Lerp(a, b, t) -> object:
+        return Vector(a.x + (b.x - a.x) * t, a.y + (b.y - a.y) * t)
 
     @staticmethod
     def dist(a, b) -> float:
         dx = a.x - b.x
         dy = a.y - b.y
-        return sqrt(dx*dx + dy*dy)
+        return sqrt(dx*dx + dy*dy)
\ No newline at end of file